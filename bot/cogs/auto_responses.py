@@ -1,146 +1,281 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
+import copy
 import random
-import re
 import aiohttp
 import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.gif_pool import GifPool
+from utils.matching import KeywordAutomaton
+from utils.message_pipeline import MessageContext
+
+ROLE_ID = '1128759195202760854'
+ROLE_MENTION = f'<@&{ROLE_ID}>'
+
+ROLE_RIVALS = '1354559070199091200'
+RIVALS_MENTION = f'<@&{ROLE_RIVALS}>'
+
+# Seconds before the same user can trigger another auto response
+AUTO_RESPONSE_COOLDOWN = float(os.getenv("AUTO_RESPONSE_COOLDOWN", "10"))
+# Each trigger group may answer this many times per window in one channel
+AUTO_RESPONSE_CHANNEL_LIMIT = int(os.getenv("AUTO_RESPONSE_CHANNEL_LIMIT", "2"))
+AUTO_RESPONSE_CHANNEL_WINDOW = float(os.getenv("AUTO_RESPONSE_CHANNEL_WINDOW", "30"))
+
+# Tenor results are pooled per search term so triggers never wait on the API
+TENOR_SEARCH_URL = "https://tenor.googleapis.com/v2/search"
+TENOR_FETCH_LIMIT = int(os.getenv("TENOR_FETCH_LIMIT", "50"))  # Tenor's max page size
+GIF_POOL_LOW_WATER = int(os.getenv("GIF_POOL_LOW_WATER", "10"))
+GIF_POOL_TTL = float(os.getenv("GIF_POOL_TTL", str(6 * 3600)))
+TENOR_TIMEOUT_SECONDS = float(os.getenv("TENOR_TIMEOUT_SECONDS", "5"))
+TENOR_MAX_CONNECTIONS = int(os.getenv("TENOR_MAX_CONNECTIONS", "4"))
+
+# Used by guilds that haven't edited their triggers with /trigger_add or /trigger_remove.
+# Checked in order; the first group with any matching keyword wins
+DEFAULT_TRIGGERS = [
+    {
+        "keywords": ["rivals", "marvel", RIVALS_MENTION],
+        "type": "gif",
+        "search": "marvel rivals",
+        "fallback": [
+            "https://tenor.com/view/groot-marvel-marvel-rivaks-ellunya-meme-gif-12648975181727081457",
+        ]
+    },
+    {
+        "keywords": ["val", "valorant", ROLE_MENTION],
+        "type": "gif",
+        "search": "valorant funny",
+        "fallback": [
+            "https://tenor.com/view/choso-jjk-choso-choso-panic-insane-choso-anime-insane-gif-5693401929827560865",
+            "nah",
+            "https://tenor.com/view/valorant-nerd-brimstone-viper-omen-gif-9861738447246078182",
+        ]
+    },
+    {
+        "keywords": ["hello", "hi", "yo", "hey"],
+        "type": "gif",
+        "search": "anime hello",
+        "fallback": [
+            "wAZAAAAAAAAAAAAAA",
+            ":man_with_probing_cane::skin-tone-3:",
+            "https://tenor.com/view/anime-lolis-cute-dancing-girl-gif-25488979",
+        ]
+    },
+    {
+        "keywords": ["league", "league of legends", "lol"],
+        "type": "gif",
+        "search": "league of legends funny",
+        "fallback": [
+            "https://tenor.com/view/league-of-legends-gif-24451872",
+            "https://tenor.com/view/dog-run-away-scared-jump-out-window-dogs-gif-7549502188035868767",
+        ]
+    },
+    {
+        "keywords": ["1am"],
+        "type": "gif",
+        "search": "druski dance",
+        "fallback": [
+            "https://tenor.com/view/druski-kai-cenat-kevin-hart-dance-dancing-gif-5733905296005353973",
+        ]
+    },
+    {
+        "keywords": ["juice"],
+        "type": "gif",
+        "search": "juice wrld dance",
+        "fallback": [
+            "https://tenor.com/view/jw3-juice-wrld-2019-my-year-gif-14321242830957102561",
+        ]
+    },
+]
 
 class AutoResponses(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.tenor_api_key = os.getenv("TENOR_API_KEY")  # Store your API key in environment variables
         self.session = None
+        # Tenor's `next` position per term, so each refill brings new results
+        self.tenor_positions: Dict[str, str] = {}
+        self.gif_pool = GifPool(self.search_gifs, low_water=GIF_POOL_LOW_WATER, ttl=GIF_POOL_TTL)
+        # Compiled triggers per guild; guilds using the defaults share `self.default_triggers`
+        self.default_triggers = self.compile_triggers(DEFAULT_TRIGGERS)
+        self.guild_triggers: Dict[int, Tuple[KeywordAutomaton, List[Dict[str, Any]]]] = {}
+        bot.cooldowns.configure("auto_response", 1, AUTO_RESPONSE_COOLDOWN)
     
     async def cog_load(self):
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=TENOR_TIMEOUT_SECONDS),
+            connector=aiohttp.TCPConnector(limit=TENOR_MAX_CONNECTIONS, limit_per_host=TENOR_MAX_CONNECTIONS),
+        )
+        for guild_id in self.bot.guild_configs.overrides:
+            self.on_guild_config(guild_id, self.bot.guild_configs.get(guild_id))
+        self.bot.guild_configs.subscribe(self.on_guild_config)
+        if self.tenor_api_key:
+            self.gif_pool.warm(self.search_terms(self.default_triggers[1]))
+        self.bot.message_pipeline.register("auto_responses", self.respond, order=50)
     
     async def cog_unload(self):
+        self.bot.message_pipeline.unregister("auto_responses")
+        self.bot.guild_configs.unsubscribe(self.on_guild_config)
+        await self.gif_pool.close()
         if self.session:
             await self.session.close()
 
-    async def get_random_gif(self, search_term, limit=10):
-        if not self.session:
-            self.session = aiohttp.ClientSession()
-            
-        url = f"https://tenor.googleapis.com/v2/search?q={search_term}&key={self.tenor_api_key}&limit={limit}"
-        
-        try:
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = data.get("results", [])
-                    
-                    if results:
-                        random_gif = random.choice(results)
-                        gif_url = random_gif["media_formats"]["gif"]["url"]
-                        return gif_url
-                    else:
-                        return None
-                else:
-                    print(f"Error fetching GIF: {response.status}")
-                    return None
-        except Exception as e:
-            print(f"Error in get_random_gif: {e}")
+    @staticmethod
+    def search_terms(triggers: List[Dict[str, Any]]) -> List[str]:
+        return list({group["search"] for group in triggers if group["type"] == "gif"})
+
+    async def search_gifs(self, search_term: str) -> List[str]:
+        """One page of Tenor results for `search_term`; raises on HTTP errors."""
+        params = {
+            "q": search_term,
+            "key": self.tenor_api_key,
+            "limit": str(TENOR_FETCH_LIMIT),
+            "media_filter": "gif",
+        }
+        position = self.tenor_positions.get(search_term)
+        if position:
+            params["pos"] = position
+
+        async with self.session.get(TENOR_SEARCH_URL, params=params) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Tenor returned {response.status}")
+            data = await response.json()
+
+        # An empty `next` means the results ran out; start over from the top next time
+        self.tenor_positions[search_term] = data.get("next", "")
+        return [result["media_formats"]["gif"]["url"] for result in data.get("results", [])]
+
+    def compile_triggers(self, triggers: List[Dict[str, Any]]) -> Tuple[KeywordAutomaton, List[Dict[str, Any]]]:
+        """Compile every trigger keyword into one automaton; values are indexes into `triggers`."""
+        matcher = KeywordAutomaton()
+        for group_index, group in enumerate(triggers):
+            for keyword in group["keywords"]:
+                # Role mentions are matched verbatim, plain keywords as whole words
+                matcher.add(keyword.lower(), group_index, whole_word=not keyword.startswith("<@"))
+            self.bot.output.configure(
+                self.output_group(group), AUTO_RESPONSE_CHANNEL_LIMIT, AUTO_RESPONSE_CHANNEL_WINDOW
+            )
+        matcher.build()
+        return matcher, triggers
+
+    def on_guild_config(self, guild_id: int, config: Dict[str, Any]) -> None:
+        """Recompile one guild's triggers after its config changes; other guilds are untouched."""
+        if config.get("triggers") is None:
+            self.guild_triggers.pop(guild_id, None)
+            return
+        self.guild_triggers[guild_id] = self.compile_triggers(config["triggers"])
+        if self.tenor_api_key:
+            self.gif_pool.warm(self.search_terms(config["triggers"]))
+
+    @staticmethod
+    def output_group(group: Dict[str, Any]) -> str:
+        return f"auto:{group.get('search') or group['fallback'][0]}"
+
+    def find_response_group(self, lowered: str, guild_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """First matching group for already-lowercased message text."""
+        matcher, triggers = self.guild_triggers.get(guild_id, self.default_triggers)
+        group_index = matcher.first_value(lowered)
+        if group_index is None:
             return None
+        return triggers[group_index]
+
+    async def respond(self, ctx: MessageContext) -> None:
+        message = ctx.message
+        matching_group = self.find_response_group(ctx.lowered, message.guild.id if message.guild else None)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author == self.bot.user:
+        if matching_group is None or self.bot.cooldowns.retry_after("auto_response", message.author.id):
+            return
+        use_gif = matching_group["type"] == "gif" and self.tenor_api_key
+        # A trigger with nothing to send must not spend the channel's token or the user's cooldown
+        if not (use_gif or matching_group["fallback"]):
+            return
+        # Checked before the cooldown is spent, so a suppressed trigger doesn't cost the user anything
+        if not self.bot.output.allow(message.channel.id, self.output_group(matching_group)):
             return
+        self.bot.cooldowns.hit("auto_response", message.author.id)
 
-        role_id = '1128759195202760854'
-        role_mention = f'<@&{role_id}>'
-        
-        role_rivals = '1354559070199091200'
-        rivals_mention = f'<@&{role_rivals}>'
-        
-        response_groups = {
-            ("rivals", "marvel", rivals_mention): {
-                "type": "gif",
-                "search": "marvel rivals",
-                "fallback": [
-                    "https://tenor.com/view/groot-marvel-marvel-rivaks-ellunya-meme-gif-12648975181727081457",
-                ]
-            },
-            ("val", "valorant", role_mention): {
-                "type": "gif",
-                "search": "valorant funny",
-                "fallback": [
-                    "https://tenor.com/view/choso-jjk-choso-choso-panic-insane-choso-anime-insane-gif-5693401929827560865",
-                    "nah",
-                    "https://tenor.com/view/valorant-nerd-brimstone-viper-omen-gif-9861738447246078182",
-                ]
-            },
-            ("hello", "hi", "yo", "hey"): {
-                "type": "gif",
-                "search": "anime hello",
-                "fallback": [
-                    "wAZAAAAAAAAAAAAAA",
-                    ":man_with_probing_cane::skin-tone-3:",
-                    "https://tenor.com/view/anime-lolis-cute-dancing-girl-gif-25488979",
-                ]
-            },
-            ("league", "league of legends", "lol"): {
-                "type": "gif",
-                "search": "league of legends funny",
-                "fallback": [
-                    "https://tenor.com/view/league-of-legends-gif-24451872",
-                    "https://tenor.com/view/dog-run-away-scared-jump-out-window-dogs-gif-7549502188035868767",
-                ]
-            },
-            ("1am",): {
-                "type": "gif",
-                "search": "druski dance",
-                "fallback": [
-                    "https://tenor.com/view/druski-kai-cenat-kevin-hart-dance-dancing-gif-5733905296005353973",
-                ]
-            },
-            ("juice",): {
-                "type": "gif",
-                "search": "juice wrld dance",
-                "fallback": [
-                    "https://tenor.com/view/jw3-juice-wrld-2019-my-year-gif-14321242830957102561",
-                ]
-            },
-        }
+        response = None
+        if use_gif:
+            response = self.gif_pool.pop(matching_group["search"])
+        if response is None:
+            if not matching_group["fallback"]:
+                return
+            response = random.choice(matching_group["fallback"])
+        await message.channel.send(response)
+
+    def editable_triggers(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The guild's own trigger list, seeded from the defaults on first edit."""
+        if config.get("triggers") is None:
+            config["triggers"] = copy.deepcopy(DEFAULT_TRIGGERS)
+        return config["triggers"]
+
+    @app_commands.command(name="trigger_add", description="Add an auto response to this server (admin only).")
+    @app_commands.describe(
+        keywords="Comma-separated words that trigger it",
+        search="Tenor search term for a GIF reply",
+        responses="Replies separated by |, used when there's no GIF",
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def trigger_add(self, interaction: discord.Interaction, keywords: str, search: Optional[str] = None, responses: str = ""):
+        keyword_list = [keyword.strip() for keyword in keywords.split(",") if keyword.strip()]
+        fallback = [response.strip() for response in responses.split("|") if response.strip()]
+        if not keyword_list or not (search or fallback):
+            await interaction.response.send_message("Give at least one keyword and a search term or a response.", ephemeral=True)
+            return
+        if search and not fallback and not self.tenor_api_key:
+            await interaction.response.send_message("GIF search is off on this bot, so give at least one response.", ephemeral=True)
+            return
+
+        trigger = {"keywords": keyword_list, "type": "gif" if search else "text", "search": search, "fallback": fallback}
+        config = await self.bot.guild_configs.update(
+            interaction.guild_id, lambda config: self.editable_triggers(config).append(trigger)
+        )
+        await interaction.response.send_message(
+            f"Added trigger #{len(config['triggers'])} for {', '.join(keyword_list)}.", ephemeral=True
+        )
+
+    @app_commands.command(name="trigger_remove", description="Remove an auto response by its number in /trigger_list (admin only).")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def trigger_remove(self, interaction: discord.Interaction, number: int):
+        _, triggers = self.guild_triggers.get(interaction.guild_id, self.default_triggers)
+        if not 1 <= number <= len(triggers):
+            await interaction.response.send_message(f"Pick a number from 1 to {len(triggers)}.", ephemeral=True)
+            return
+        await self.bot.guild_configs.update(
+            interaction.guild_id, lambda config: self.editable_triggers(config).pop(number - 1)
+        )
+        await interaction.response.send_message(f"Removed trigger #{number}.", ephemeral=True)
+
+    @app_commands.command(name="trigger_reset", description="Go back to the built-in auto responses (admin only).")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def trigger_reset(self, interaction: discord.Interaction):
+        await self.bot.guild_configs.update(interaction.guild_id, lambda config: config.pop("triggers", None))
+        await interaction.response.send_message("Auto responses reset to the defaults.", ephemeral=True)
+
+    @app_commands.command(name="trigger_list", description="List this server's auto responses.")
+    @app_commands.guild_only()
+    async def trigger_list(self, interaction: discord.Interaction):
+        _, triggers = self.guild_triggers.get(interaction.guild_id, self.default_triggers)
+        embed = discord.Embed(title="Auto Responses", color=discord.Color.blue())
+        for number, group in enumerate(triggers[:25], 1):
+            reply = f"GIF: {group['search']}" if group["type"] == "gif" else f"{len(group['fallback'])} response(s)"
+            embed.add_field(name=f"#{number}: {', '.join(group['keywords'])}", value=reply, inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
-        content = message.content.lower()
-        
-        matching_group = None
-        matching_keywords = None
-        
-        for keywords, response_data in response_groups.items():
-            for keyword in keywords:
-                if keyword == role_mention and keyword in message.content:
-                    matching_group = response_data
-                    matching_keywords = keywords
-                    break
-                
-                elif keyword != role_mention:
-                    pattern = r'\b' + re.escape(keyword.lower()) + r'\b'
-                    if re.search(pattern, content):
-                        matching_group = response_data
-                        matching_keywords = keywords
-                        break
-            
-            if matching_group:
-                break
-
-        if matching_group:
-            if matching_group["type"] == "gif" and self.tenor_api_key:
-                search_term = matching_group["search"]
-                gif_url = await self.get_random_gif(search_term)
-                
-                if gif_url:
-                    await message.channel.send(gif_url)
-                else:
-                    response = random.choice(matching_group["fallback"])
-                    await message.channel.send(response)
-            else:
-                response = random.choice(matching_group["fallback"])
-                await message.channel.send(response)
-
-        await self.bot.process_commands(message)
+    @commands.command(name="gifstats")
+    @commands.is_owner()
+    async def gif_stats(self, ctx):
+        """Show GIF pool counters and how many GIFs are pooled per search term."""
+        embed = discord.Embed(title="GIF Pool", color=discord.Color.blue())
+        for name, value in self.gif_pool.stats.items():
+            embed.add_field(name=name.replace("_", " ").capitalize(), value=str(value), inline=True)
+        pooled = ", ".join(f"{term}: {self.gif_pool.size(term)}" for term in sorted(self.gif_pool.pools))
+        embed.add_field(name="Pooled", value=pooled[:1024] or "empty", inline=False)
+        await ctx.send(embed=embed)
 
 
 async def setup(bot: commands.Bot):
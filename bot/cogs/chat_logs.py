@@ -1,76 +1,51 @@
 import discord
 from discord.ext import commands
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import re
+
+from utils.batching import BatchWriter
+from utils.message_pipeline import MessageContext
+from utils.regex_search import REGEX_TIMEOUT, search_texts
+
+# Longer patterns are refused by /regexsearch
+REGEX_MAX_LENGTH = 100
+# /regexsearch only looks at this many of the newest messages
+REGEX_MAX_SCAN = 10000
 
 class ChatLogs(commands.Cog):
-    """Listener to log messages to either MongoDB or in-memory storage."""
+    """Listener to log messages to the bot's storage backend."""
 
     def __init__(self, bot):
         self.bot = bot
-        self.use_mongodb = bot.use_mongodb
-        self.executor = ThreadPoolExecutor(max_workers=4)
-        
-        if self.use_mongodb:
-            self.collection = self.bot.mongo_client["kohii"]["user_messages"]
-        else:
-            # Initialize in-memory storage if MongoDB is not available
-            if "chat_logs" not in bot.in_memory_storage:
-                bot.in_memory_storage["chat_logs"] = []
+        backend = bot.storage.backend
+        self.writer = BatchWriter(
+            backend.insert_chat_messages,
+            blocking=backend.blocking,
+            runner=bot.storage.run,
+            name="chat-log-writer",
+        )
+
+    async def cog_load(self):
+        self.writer.start()
+        self.bot.message_pipeline.register("chat_logs", self.log_message, order=10)
+
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("chat_logs")
+        await self.writer.close()
 
     def save_message(self, message_data: Dict[str, Any]) -> None:
-        """Save a message to either MongoDB or in-memory storage."""
-        if self.use_mongodb:
-            # Insert message into MongoDB using executor
-            def insert_message():
-                self.collection.insert_one(message_data)
-            self.executor.submit(insert_message)
-        else:
-            # Save to in-memory storage
-            self.bot.in_memory_storage["chat_logs"].append(message_data)
-
-    def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get user messages from either MongoDB or in-memory storage."""
-        if self.use_mongodb:
-            # Query MongoDB for user messages, sorted by timestamp
-            return list(self.collection.find(
-                {"user_id": user_id}
-            ).sort("timestamp", -1).limit(limit))
-        else:
-            # Get from in-memory storage
-            return sorted(
-                [msg for msg in self.bot.in_memory_storage["chat_logs"] if msg["user_id"] == user_id],
-                key=lambda x: x["timestamp"],
-                reverse=True
-            )[:limit]
-
-    def search_messages(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Search messages containing a keyword from either MongoDB or in-memory storage."""
-        if self.use_mongodb:
-            # Query MongoDB for messages containing the keyword
-            return list(self.collection.find(
-                {"content": {"$regex": keyword, "$options": "i"}}
-            ).sort("timestamp", -1).limit(limit))
-        else:
-            # Search in-memory storage
-            return sorted(
-                [msg for msg in self.bot.in_memory_storage["chat_logs"] if keyword.lower() in msg["content"].lower()],
-                key=lambda x: x["timestamp"],
-                reverse=True
-            )[:limit]
-
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """Log messages when they are sent."""
-        if message.author.bot:
-            return
+        """Queue a message for the next batched write."""
+        self.writer.submit(message_data)
 
+    async def log_message(self, ctx: MessageContext) -> None:
+        """Log messages when they are sent."""
+        message = ctx.message
         message_data = {
             "user_id": message.author.id,
             "username": str(message.author),
-            "content": message.content,
+            "content": ctx.content,
             "channel_id": message.channel.id,
             "channel_name": message.channel.name,
             "timestamp": datetime.utcnow(),
@@ -83,7 +58,7 @@ class ChatLogs(commands.Cog):
     @commands.command(name="mylogs")
     async def my_logs(self, ctx, limit: int = 10):
         """View your recent messages."""
-        messages = self.get_user_messages(ctx.author.id, limit)
+        messages = await self.bot.storage.get_user_messages(ctx.author.id, limit)
         
         if not messages:
             await ctx.send("No messages found in your history.")
@@ -99,11 +74,50 @@ class ChatLogs(commands.Cog):
         
         await ctx.send(embed=embed)
 
+    @commands.command(name="logstats")
+    @commands.is_owner()
+    async def log_stats(self, ctx):
+        """Show chat-log ingestion queue depth and counters."""
+        stats = self.writer.get_stats()
+        embed = discord.Embed(title="Chat Log Ingestion", color=discord.Color.blue())
+        for name, value in stats.items():
+            embed.add_field(name=name.capitalize(), value=str(value), inline=True)
+        plans = await self.bot.storage.describe_query_plans()
+        for name, plan in plans.items():
+            # COLLSCAN (Mongo) and bare SCAN (SQLite) mean the query is not index-backed
+            flag = "⚠️ " if "COLLSCAN" in plan or re.search(r"\bSCAN \w+\b(?! VIRTUAL TABLE)", plan) else ""
+            embed.add_field(name=f"Plan: {name}", value=f"{flag}`{plan}`", inline=False)
+        await ctx.send(embed=embed)
+
     @commands.command(name="search")
     async def search(self, ctx, *, keyword: str):
         """Search for messages containing a keyword."""
-        messages = self.search_messages(keyword)
-        
+        messages = await self.bot.storage.search_messages(keyword)
+        await self.send_search_results(ctx, keyword, messages)
+
+    @commands.command(name="regexsearch")
+    @commands.is_owner()
+    async def regex_search(self, ctx, *, pattern: str):
+        """Search messages with a regular expression (slower, unindexed; owner only)."""
+        if len(pattern) > REGEX_MAX_LENGTH:
+            await ctx.send(f"Keep the pattern under {REGEX_MAX_LENGTH} characters.")
+            return
+        try:
+            re.compile(pattern)
+        except re.error:
+            await ctx.send(f"'{pattern}' is not a valid regular expression.")
+            return
+
+        # The in-memory backend copies its newest messages on the loop; the match itself runs in a child process
+        recent = await self.bot.storage.get_recent_messages(REGEX_MAX_SCAN)
+        try:
+            found = await search_texts(pattern, [msg.get("content") or "" for msg in recent])
+        except asyncio.TimeoutError:
+            await ctx.send(f"'{pattern}' took longer than {REGEX_TIMEOUT:.0f}s to match, so the search was stopped.")
+            return
+        await self.send_search_results(ctx, pattern, [recent[i] for i in found])
+
+    async def send_search_results(self, ctx, keyword: str, messages: List[Dict[str, Any]]):
         if not messages:
             await ctx.send(f"No messages found containing '{keyword}'.")
             return
@@ -1,20 +1,35 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import random
-from pymongo import MongoClient
+import asyncio
 import time
 import io
-from PIL import Image
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, features
 from io import BytesIO
 from dotenv import load_dotenv
 import os
 from typing import Dict, List, Any, Optional, Tuple
 
+from utils.drops import DropEngine
+from utils.image_cache import CardImageCache
+from utils.response_cache import COALESCED, HIT, ResponseCache
+
 load_dotenv()
 
 ACCESS_TOKEN = os.getenv("DROP_ACCESS_TOKEN")
+# Downloaded card art is kept here so restarts don't refetch it
+CARD_CACHE_DIR = os.getenv("CARD_CACHE_DIR", "card_cache")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Every card is pre-scaled to this size, so pairs always composite the same way
+CARD_SIZE = (480, 320)
+# Rendered pair images, keyed by the card ids in display order
+DROP_CACHE_SIZE = int(os.getenv("DROP_CACHE_SIZE", "256"))
+DROP_FORMAT, DROP_EXTENSION = ("WEBP", "webp") if features.check("webp") else ("PNG", "png")
+# Share of drops per rarity tier, split evenly across the cards in each tier
+RARITY_WEIGHTS = os.getenv("COFFEE_RARITY_WEIGHTS", "common:50,uncommon:30,rare:15,legendary:5")
+# Fix the seed to make drops reproducible
+DROP_SEED = int(os.getenv("COFFEE_DROP_SEED")) if os.getenv("COFFEE_DROP_SEED") else None
 
 coffee_cards = {
     "Espresso": {"rarity": "common", "image_url": "https://cdn.pixabay.com/photo/2021/06/18/10/39/mug-6345793_1280.jpg", "id": 1},
@@ -39,50 +54,71 @@ coffee_cards = {
     "Enamel Mug": {"rarity": "uncommon", "image_url": "https://cdn.pixabay.com/photo/2021/06/18/10/39/mug-6345793_1280.jpg", "id": 22},
     "Personalized Mug": {"rarity": "rare", "image_url": "https://cdn.pixabay.com/photo/2021/06/18/10/39/mug-6345793_1280.jpg", "id": 23},
     "Vintage Mug": {"rarity": "legendary", "image_url": "https://cdn.pixabay.com/photo/2021/06/18/10/39/mug-6345793_1280.jpg", "id": 24},
-    "Matcha": {"rarity": "uncommon", "image_url": "https://cdn.pixabay.com/photo/2021/06/18/10/39/mug-6345793_1280.jpg", "id": 24}
+    "Matcha": {"rarity": "uncommon", "image_url": "https://cdn.pixabay.com/photo/2021/06/18/10/39/mug-6345793_1280.jpg", "id": 25}
 }
+assert len({card["id"] for card in coffee_cards.values()}) == len(coffee_cards), "coffee card ids must be unique"
+RARITY_ORDER = ("legendary", "rare", "uncommon", "common")
+
+COLLECT_COOLDOWN_SECONDS = int(os.getenv("COLLECT_COOLDOWN_SECONDS", "300"))
+# Discord ids are ints; the env value has to be converted before comparing
+OWNER_ID = int(os.getenv("OWNER_ID")) if os.getenv("OWNER_ID") else None
+
+
+def parse_rarity_weights(spec: str) -> Dict[str, float]:
+    """'common:50,rare:15' -> {'common': 50.0, 'rare': 15.0}"""
+    weights = {}
+    for entry in spec.split(","):
+        rarity, _, weight = entry.partition(":")
+        weights[rarity.strip().lower()] = float(weight)
+    return weights
+
+
+def build_drop_engine(cards: Dict[str, Dict[str, Any]], tier_weights: Dict[str, float], seed: Optional[int] = None) -> DropEngine:
+    tier_sizes: Dict[str, int] = {}
+    for card in cards.values():
+        tier_sizes[card["rarity"]] = tier_sizes.get(card["rarity"], 0) + 1
+    names = list(cards)
+    weights = [tier_weights.get(cards[name]["rarity"], 0.0) / tier_sizes[cards[name]["rarity"]] for name in names]
+    return DropEngine(names, weights, seed=seed)
 
-user_cooldowns = {}
-OWNER_ID = os.getenv("OWNER_ID")
 
 class CoffeeCollection(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.use_mongodb = bot.use_mongodb
-        if self.use_mongodb:
-            self.mongo_client = bot.mongo_client
-            self.db = self.mongo_client["coffee_bot"]
-            self.user_collections = self.db["user_collections"]
-        else:
-            if "coffee_collections" not in bot.in_memory_storage:
-                bot.in_memory_storage["coffee_collections"] = {}
-
-    def load_user_collection(self, user_id: str) -> Tuple[List[Dict[str, Any]], str]:
-        if self.use_mongodb:
-            user = self.user_collections.find_one({"discord_id": str(user_id)})
-            discord_name = user.get("discord_name", f"User_{user_id}") if user else None
-            return user.get("cards", []) if user else [], discord_name
-        else:
-            user_data = self.bot.in_memory_storage["coffee_collections"].get(str(user_id), {})
-            return user_data.get("cards", []), user_data.get("discord_name", f"User_{user_id}")
-
-    def save_user_collection(self, user_id: str, collection: List[Dict[str, Any]], discord_name: str) -> None:
-        if self.use_mongodb:
-            user = self.user_collections.find_one({"discord_id": str(user_id)})
-            if user:
-                self.user_collections.update_one(
-                    {"discord_id": str(user_id)},
-                    {"$set": {"cards": collection, "discord_name": discord_name}},
-                )
-            else:
-                self.user_collections.insert_one(
-                    {"discord_id": str(user_id), "discord_name": discord_name, "cards": collection}
-                )
-        else:
-            self.bot.in_memory_storage["coffee_collections"][str(user_id)] = {
-                "cards": collection,
-                "discord_name": discord_name
-            }
+        # Pillow releases the GIL while decoding and encoding, so threads are enough
+        self.image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="card-images")
+        self.card_images = CardImageCache(
+            bot.http_session, CARD_CACHE_DIR, max_images=64, executor=self.image_pool, size=CARD_SIZE
+        )
+        self.drop_images = ResponseCache(max_entries=DROP_CACHE_SIZE, ttl=float("inf"))
+        self.warm_task: Optional[asyncio.Task] = None
+        bot.cooldowns.configure("collect", 1, COLLECT_COOLDOWN_SECONDS)
+        self.drops = build_drop_engine(coffee_cards, parse_rarity_weights(RARITY_WEIGHTS), seed=DROP_SEED)
+
+    async def cog_load(self):
+        self.warm_task = asyncio.create_task(self.warm_card_art())
+
+    async def cog_unload(self):
+        if self.warm_task:
+            self.warm_task.cancel()
+        self.image_pool.shutdown(wait=False)
+
+    async def warm_card_art(self):
+        """Fetch and pre-scale every card at startup so the first drops are cheap."""
+        results = await asyncio.gather(
+            *(self.card_images.get(card["id"], card["image_url"]) for card in coffee_cards.values()),
+            return_exceptions=True,
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        if failed:
+            print(f"Failed to prefetch {failed} coffee card image(s); they will load on first drop")
+
+    async def load_inventory(self, user_id: str) -> Tuple[Dict[int, int], str]:
+        inventory, discord_name = await self.bot.storage.get_coffee_inventory(user_id)
+        return inventory, discord_name or f"User_{user_id}"
+
+    async def add_cards(self, user_id: str, card_ids: List[int], discord_name: str) -> None:
+        await self.bot.storage.add_coffee_cards(user_id, card_ids, discord_name)
 
     def rarity_to_color(self, rarity: str) -> discord.Color:
         if rarity == "common":
@@ -95,13 +131,7 @@ class CoffeeCollection(commands.Cog):
             return discord.Color.gold()
         return discord.Color.default()
 
-    def combine_images(self, card_images: List[str]) -> BytesIO:
-        images = []
-        for url in card_images:
-            response = requests.get(url)
-            img = Image.open(BytesIO(response.content))
-            images.append(img)
-
+    def combine_images(self, images: List[Image.Image]) -> bytes:
         total_width = sum(img.width for img in images)
         max_height = max(img.height for img in images)
 
@@ -113,45 +143,141 @@ class CoffeeCollection(commands.Cog):
             x_offset += img.width
 
         img_byte_arr = io.BytesIO()
-        new_img.save(img_byte_arr, format="PNG")
-        img_byte_arr.seek(0)
+        if DROP_FORMAT == "WEBP":
+            new_img.save(img_byte_arr, format="WEBP", quality=80, method=4)
+        else:
+            new_img.save(img_byte_arr, format="PNG", optimize=True)
 
-        return img_byte_arr
+        return img_byte_arr.getvalue()
+
+    async def render_cards(self, cards: List[Dict[str, Any]]) -> BytesIO:
+        """Composite image for a drop, rendered once per card combination then reused."""
+        key = tuple(card["id"] for card in cards)
+        outcome, cached = self.drop_images.lookup(key)
+        if outcome == HIT:
+            return BytesIO(cached)
+        if outcome == COALESCED:
+            # Shielded so one cancelled /collect does not cancel the render for everyone else
+            return BytesIO(await asyncio.shield(cached))
+
+        try:
+            images = await asyncio.gather(*(self.card_images.get(card["id"], card["image_url"]) for card in cards))
+            data = await asyncio.get_running_loop().run_in_executor(self.image_pool, self.combine_images, list(images))
+        except BaseException as e:
+            self.drop_images.abandon(key, e if isinstance(e, Exception) else RuntimeError("Render was cancelled"))
+            raise
+        self.drop_images.resolve(key, data)
+        return BytesIO(data)
 
     @app_commands.command(name="collect", description="Collect a random pair of coffee-related cards!")
     async def collect(self, interaction: discord.Interaction):
         user_id = interaction.user.id
-        current_time = time.time()
 
-        if (
-            user_id != OWNER_ID
-            and user_id in user_cooldowns
-            and current_time - user_cooldowns[user_id] < 300  # 5 minutes cooldown
-        ):
+        # Hitting the cooldown before any awaits means a double-click can't collect twice
+        wait = 0.0 if user_id == OWNER_ID else self.bot.cooldowns.hit("collect", user_id)
+        if wait:
             await interaction.response.send_message(
-                "You need to wait a bit before collecting again!", ephemeral=True
+                f"You need to wait a bit before collecting again! Try again <t:{int(time.time() + wait)}:R>.",
+                ephemeral=True,
             )
             return
 
-        card_1, card_2 = random.sample(list(coffee_cards.keys()), 2)
+        # Image work can outlast the 3 second interaction deadline
+        await interaction.response.defer()
+
+        card_1, card_2 = self.drops.draw(2)
         card_1_details = coffee_cards[card_1]
         card_2_details = coffee_cards[card_2]
 
-        card_images = [card_1_details["image_url"], card_2_details["image_url"]]
-        combined_image = self.combine_images(card_images)
+        try:
+            await self.add_cards(
+                str(user_id), [card_1_details["id"], card_2_details["id"]], interaction.user.display_name
+            )
+        except Exception as e:
+            print(f"Error saving cards for {user_id}: {e}")
+            self.bot.cooldowns.reset("collect", user_id)
+            await interaction.followup.send("Couldn't brew your cards right now, try again shortly!")
+            return
 
         embed = discord.Embed(
             title="You collected new cards!",
             description=f"You collected a {card_1} and {card_2}!",
             color=self.rarity_to_color(card_1_details["rarity"]),
         )
-        embed.set_image(url="attachment://combined_image.png")
 
-        await interaction.response.send_message(
-            embed=embed, file=discord.File(combined_image, "combined_image.png")
+        try:
+            combined_image = await self.render_cards([card_1_details, card_2_details])
+        except Exception as e:
+            # The cards are already saved, so still announce them
+            print(f"Error rendering cards {card_1} and {card_2}: {e}")
+            await interaction.followup.send(embed=embed)
+            return
+
+        embed.set_image(url=f"attachment://combined_image.{DROP_EXTENSION}")
+        await interaction.followup.send(
+            embed=embed, file=discord.File(combined_image, f"combined_image.{DROP_EXTENSION}")
         )
 
-        user_cooldowns[user_id] = current_time
+    @app_commands.command(name="mycards", description="Show the coffee cards you've collected.")
+    async def mycards(self, interaction: discord.Interaction):
+        inventory, _ = await self.load_inventory(str(interaction.user.id))
+        if not inventory:
+            await interaction.response.send_message("You haven't collected any cards yet. Try `/collect`!", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title=f"{interaction.user.display_name}'s Coffee Cards",
+            description=f"{sum(inventory.values())} cards, {len(inventory)}/{len(coffee_cards)} unique",
+            color=discord.Color.dark_gold(),
+        )
+        for rarity in RARITY_ORDER:
+            lines = [
+                f"{name} ×{inventory[card['id']]}"
+                for name, card in coffee_cards.items()
+                if card["rarity"] == rarity and inventory.get(card["id"])
+            ]
+            if lines:
+                embed.add_field(name=rarity.capitalize(), value="\n".join(lines), inline=False)
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="leaderboard", description="Top coffee card collectors.")
+    async def leaderboard(self, interaction: discord.Interaction):
+        top = await self.bot.storage.get_coffee_leaderboard(10)
+        if not top:
+            await interaction.response.send_message("Nobody has collected any cards yet!", ephemeral=True)
+            return
+
+        lines = [
+            f"**{rank}.** {entry.get('discord_name') or 'User_' + entry['discord_id']}: {entry['total']} cards"
+            for rank, entry in enumerate(top, start=1)
+        ]
+        embed = discord.Embed(title="Coffee Card Leaderboard", description="\n".join(lines), color=discord.Color.gold())
+        await interaction.response.send_message(embed=embed)
+
+    @commands.command(name="cardstats")
+    @commands.is_owner()
+    async def card_stats(self, ctx):
+        """Show where card art came from and how often drop images were reused."""
+        images = self.card_images.stats
+        drops = self.drop_images.stats
+        embed = discord.Embed(title="Card Images", color=discord.Color.blue())
+        embed.add_field(
+            name="Card art",
+            value=(
+                f"{len(self.card_images.images)}/{self.card_images.max_images} in memory\n"
+                f"{images['memory_hits']} memory hits, {images['disk_hits']} disk hits, {images['fetches']} fetches"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name="Drop renders",
+            value=(
+                f"{len(self.drop_images.entries)} cached, {drops['hits']} hits, {drops['misses']} misses, "
+                f"{drops['coalesced']} coalesced, {drops['evictions']} evicted"
+            ),
+            inline=False,
+        )
+        await ctx.send(embed=embed)
 
 
 async def setup(bot):
@@ -1,20 +1,125 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from google import genai
+from google.genai import types
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
-from typing import Dict, Optional, List
+from typing import AsyncIterator, Awaitable, Callable, Optional, List, Union
+
+from utils.conversations import ConversationStore, estimate_tokens
+from utils.message_pipeline import MessageContext
+from utils.response_cache import COALESCED, HIT, ResponseCache
+from utils.scheduler import FairScheduler, Ticket
 
 load_dotenv()
 
+# Stream answers into progressively edited messages; "0" waits for the full answer
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "1") != "0"
+# Discord allows roughly 5 edits per 5 seconds per channel
+STREAM_EDIT_INTERVAL = 1.0
+MAX_MESSAGE_LENGTH = 1900
+
+# Request scheduling: tune GEMINI_RPM to the API key's requests-per-minute quota
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_PER_USER_LIMIT = int(os.getenv("GEMINI_PER_USER_LIMIT", "1"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10"))
+QUEUE_UPDATE_INTERVAL = 2.0
+# Per-user question limit, shared by /ask_kohii and session follow-ups
+GEMINI_USER_RATE = int(os.getenv("GEMINI_USER_RATE", "5"))
+GEMINI_USER_WINDOW = float(os.getenv("GEMINI_USER_WINDOW", "60"))
+
+# Conversation memory bounds
+HISTORY_MAX_TURNS = int(os.getenv("GEMINI_HISTORY_TURNS", "20"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("GEMINI_HISTORY_TOKENS", "2000"))
+SESSION_IDLE_TTL = int(os.getenv("GEMINI_SESSION_TTL", "3600"))
+MAX_SESSIONS = int(os.getenv("GEMINI_MAX_SESSIONS", "1000"))
+HISTORY_MAX_BYTES = int(os.getenv("GEMINI_HISTORY_MAX_BYTES", str(8 * 1024 * 1024)))
+# ConversationStore roles -> Gemini content roles
+GENAI_ROLES = {"User": "user", "Assistant": "model"}
+
+# Answers to context-free first questions, shared across users
+RESPONSE_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", "3600"))
+
+
+def find_split_point(text: str, limit: int) -> int:
+    """Index to cut `text` at so the head fits in `limit`, preferring sentence ends."""
+    for separator in (". ", "\n", " "):
+        index = text.rfind(separator, 0, limit)
+        if index > limit // 2:
+            return index + 1
+    return limit
+
+
+class StreamingReply:
+    """Edits a Discord message in place as answer text streams in.
+
+    Edits are throttled to `edit_interval`; once a message would pass
+    `max_length` it is finalized and the rest continues in a new message.
+    """
+
+    def __init__(
+        self,
+        message: discord.Message,
+        send_new: Callable[[str], Awaitable[discord.Message]],
+        prefix: str = "",
+        max_length: int = MAX_MESSAGE_LENGTH,
+        edit_interval: float = STREAM_EDIT_INTERVAL,
+    ):
+        self.message = message
+        self.send_new = send_new
+        self.prefix = prefix
+        self.max_length = max_length
+        self.edit_interval = edit_interval
+        self.pending = ""
+        self.parts: List[str] = []
+        self.last_edit = 0.0
+
+    async def feed(self, delta: str) -> None:
+        loop = asyncio.get_running_loop()
+        self.parts.append(delta)
+        self.pending += delta
+
+        while len(self.prefix) + len(self.pending) > self.max_length:
+            cut = find_split_point(self.pending, self.max_length - len(self.prefix))
+            await self.message.edit(content=self.prefix + self.pending[:cut].rstrip())
+            self.pending = self.pending[cut:].lstrip()
+            self.prefix = ""
+            self.message = await self.send_new("…")
+            self.last_edit = loop.time()
+
+        if self.pending and loop.time() - self.last_edit >= self.edit_interval:
+            await self.message.edit(content=self.prefix + self.pending + " …")
+            self.last_edit = loop.time()
+
+    async def finish(self) -> str:
+        """Final edit without the typing marker; returns the full answer."""
+        await self.message.edit(content=(self.prefix + self.pending) or "*(no response)*")
+        return "".join(self.parts)
+
 class Gemini(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.client = genai.Client(api_key=os.getenv("GOOGLE_API"))
         self.model = "gemini-2.5-flash-preview-05-20"
         self.model_display = "Gemini 2.5 Flash"
-        self.active_sessions: Dict[int, bool] = {}  # Track active sessions by user ID
-        self.conversation_history: Dict[int, List[str]] = {}  # Track conversation history by user ID
+        # Active sessions and their bounded history, keyed by user ID
+        self.conversations = ConversationStore(
+            max_turns=HISTORY_MAX_TURNS,
+            max_context_tokens=HISTORY_TOKEN_BUDGET,
+            idle_ttl=SESSION_IDLE_TTL,
+            max_sessions=MAX_SESSIONS,
+            max_bytes=HISTORY_MAX_BYTES,
+        )
+        bot.cooldowns.configure("gemini", GEMINI_USER_RATE, GEMINI_USER_WINDOW)
+        self.response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+        self.scheduler = FairScheduler(
+            max_concurrency=GEMINI_MAX_CONCURRENCY,
+            per_key_limit=GEMINI_PER_USER_LIMIT,
+            rate_per_minute=GEMINI_RPM,
+        )
         
         # response styles
         self.styles = {
@@ -26,42 +131,126 @@ class Gemini(commands.Cog):
             "creative": "You are a creative AI assistant. Think outside the box and provide unique perspectives."
         }
 
-    def split_response(self, text: str, max_length: int = 1900) -> list[str]:
-        # fit discord msg limits
-        if len(text) <= max_length:
-            return [text]
-        
-        chunks = []
-        current_chunk = ""
-        
-        sentences = text.split(". ")
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) + 2 <= max_length:
-                current_chunk += sentence + ". "
-            else:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence + ". "
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
+    async def cog_load(self):
+        self.sweep_sessions.start()
+        self.bot.message_pipeline.register("gemini", self.continue_session, order=40)
 
-    def get_conversation_context(self, user_id: int) -> str:
-        """Get the conversation history for a user."""
-        if user_id not in self.conversation_history:
-            return ""
-        
-        # Get the last 5 exchanges to keep context manageable
-        history = self.conversation_history[user_id][-10:]  # Last 5 Q&A pairs
-        return "\n".join(history)
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("gemini")
+        self.sweep_sessions.cancel()
+
+    @tasks.loop(minutes=5)
+    async def sweep_sessions(self):
+        self.conversations.sweep()
+
+    async def generate(
+        self, contents: List[types.Content], system_instruction: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Yield answer text as it arrives, without blocking the event loop."""
+        # The system instruction goes in the config rather than the turns, so every
+        # request in a session starts with the same prefix and the API's implicit
+        # context caching can reuse it
+        config = types.GenerateContentConfig(system_instruction=system_instruction) if system_instruction else None
+        usage = None
+        if GEMINI_STREAMING:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=config
+            )
+            async for chunk in stream:
+                usage = chunk.usage_metadata or usage
+                if chunk.text:
+                    yield chunk.text
+        else:
+            response = await self.client.aio.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=config
+            )
+            usage = response.usage_metadata
+            yield response.text
+        self.record_usage(contents, system_instruction, usage)
+
+    def record_usage(self, contents: List[types.Content], system_instruction: Optional[str], usage) -> None:
+        if usage is not None and usage.prompt_token_count:
+            self.conversations.record_prompt(usage.prompt_token_count, usage.cached_content_token_count or 0)
+            return
+        # No usage metadata (e.g. the stream ended early), so fall back to an estimate
+        text = "".join(part.text or "" for content in contents for part in content.parts)
+        self.conversations.record_prompt(estimate_tokens((system_instruction or "") + text))
+
+    def queue_status(self, ticket: Ticket, prefix: str = "") -> str:
+        if ticket.granted:
+            return prefix + ("…" if prefix else "Pondering...")
+        return f"{prefix}⏳ Waiting in line (position {self.scheduler.position(ticket)})..."
+
+    async def wait_for_turn(self, ticket: Ticket, message: discord.Message, prefix: str = "") -> None:
+        """Keep `message` showing the ticket's queue position until it is admitted."""
+        shown = message.content
+        while not await ticket.wait(QUEUE_UPDATE_INTERVAL):
+            status = self.queue_status(ticket, prefix)
+            if status != shown:
+                await message.edit(content=status)
+                shown = status
+        status = self.queue_status(ticket, prefix)
+        if status != shown:
+            await message.edit(content=status)
+
+    async def stream_reply(
+        self, reply: StreamingReply, contents: List[types.Content], system_instruction: Optional[str] = None
+    ) -> str:
+        async for delta in self.generate(contents, system_instruction):
+            await reply.feed(delta)
+        return await reply.finish()
+
+    async def answer_with_model(
+        self,
+        user_id: int,
+        contents: List[types.Content],
+        send_new: Callable[[str], Awaitable[discord.Message]],
+        prefix: str = "",
+        system_instruction: Optional[str] = None,
+    ) -> str:
+        """Wait for a scheduler slot, then stream the model's answer."""
+        ticket = self.scheduler.submit(user_id)
+        try:
+            first_msg = await send_new(self.queue_status(ticket, prefix))
+            await self.wait_for_turn(ticket, first_msg, prefix)
+            reply = StreamingReply(first_msg, send_new, prefix=prefix)
+            return await self.stream_reply(reply, contents, system_instruction)
+        finally:
+            self.scheduler.release(ticket)
+
+    async def answer_from_cache(
+        self,
+        answer: Union[asyncio.Future, str],
+        send_new: Callable[[str], Awaitable[discord.Message]],
+        prefix: str = "",
+    ) -> str:
+        """Post a cached answer, or wait for an identical in-flight request to finish."""
+        message = await send_new(prefix + ("…" if prefix else "Pondering..."))
+        if not isinstance(answer, str):
+            # Shielded so one cancelled waiter does not cancel the shared answer for everyone else
+            answer = await asyncio.shield(answer)
+        reply = StreamingReply(message, send_new, prefix=prefix)
+        await reply.feed(answer)
+        return await reply.finish()
+
+    def build_contents(self, user_id: int, question: str) -> List[types.Content]:
+        """Recent conversation turns plus the new question as structured contents, within the token budget.
+
+        The question only goes into history once it has been answered, so a failed request leaves no stray turn.
+        """
+        turns = self.conversations.context(user_id)
+        # The token budget can cut mid-exchange; a conversation has to open with a user turn
+        while turns and turns[0][0] != "User":
+            turns.pop(0)
+        turns.append(("User", question))
+        return [types.Content(role=GENAI_ROLES[role], parts=[types.Part(text=text)]) for role, text in turns]
 
     def add_to_history(self, user_id: int, message: str, is_user: bool = True):
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = []
-        
-        prefix = "User: " if is_user else "Assistant: "
-        self.conversation_history[user_id].append(f"{prefix}{message}")
+        self.conversations.add(user_id, message, is_user)
 
     @discord.app_commands.command(name="ask_kohii", description="Start a chat session with Kohii")
     @discord.app_commands.describe(
@@ -74,91 +263,132 @@ class Gemini(commands.Cog):
         question: str,
         style: str = "default"
     ):
+        wait = self.bot.cooldowns.hit("gemini", interaction.user.id)
+        if wait:
+            await interaction.response.send_message(
+                f"You're asking too fast! Try again <t:{int(time.time() + wait)}:R>.", ephemeral=True
+            )
+            return
+
         await interaction.response.defer()
         
         try:
             system_prompt = self.styles.get(style.lower(), self.styles["default"])
+            # Only a question asked with no prior context has a shareable answer
+            cache_key = None
+            if interaction.user.id not in self.conversations:
+                cache_key = self.response_cache.make_key(question, system_prompt)
             
-            self.add_to_history(interaction.user.id, question)
-            
-            context = self.get_conversation_context(interaction.user.id)
-            
-            full_prompt = f"{system_prompt}\n\n"
-            if context:
-                full_prompt += f"Previous conversation:\n{context}\n\n"
-            full_prompt += f"Current question: {question}"
-            
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=full_prompt
-            )
-            
-            self.add_to_history(interaction.user.id, response.text, is_user=False)
-            
-            self.active_sessions[interaction.user.id] = True
+            contents = self.build_contents(interaction.user.id, question)
             
             header = f" **{self.model_display}** ({style.capitalize()})\n"
             header += f" **Question:** {question}\n\n"
-            
-            response_chunks = self.split_response(response.text)
-            
-            first_msg = header + "**Answer:**\n" + response_chunks[0]
-            if len(first_msg) > 1900:
+            prefix = header + "**Answer:**\n"
+            if len(prefix) > MAX_MESSAGE_LENGTH // 2:
                 await interaction.followup.send(header)
-                await interaction.followup.send("**Answer:**\n" + response_chunks[0])
-                await interaction.followup.send("*Chat session started. Type your next question or 'stop session' to end.*")
+                prefix = "**Answer:**\n"
+
+            send_followup = lambda content: interaction.followup.send(content, wait=True)
+            outcome, cached = self.response_cache.lookup(cache_key) if cache_key else (None, None)
+            if outcome in (HIT, COALESCED):
+                answer = await self.answer_from_cache(cached, send_followup, prefix)
             else:
-                await interaction.followup.send(first_msg)
-                await interaction.followup.send("*Chat session started. Type your next question or 'stop session' to end.*")
+                try:
+                    answer = await self.answer_with_model(
+                        interaction.user.id, contents, send_followup, prefix, system_instruction=system_prompt
+                    )
+                except BaseException as e:
+                    if cache_key:
+                        self.response_cache.abandon(
+                            cache_key, e if isinstance(e, Exception) else RuntimeError("Request was cancelled")
+                        )
+                    raise
+                if cache_key:
+                    self.response_cache.resolve(cache_key, answer)
             
-            for i, chunk in enumerate(response_chunks[1:], 2):
-                await interaction.followup.send(f"**Answer (Part {i}):**\n{chunk}")
-                await interaction.followup.send("*Chat session started. Type your next question or 'stop session' to end.*")
+            self.add_to_history(interaction.user.id, question)
+            self.add_to_history(interaction.user.id, answer, is_user=False)
+            
+            self.conversations.start(interaction.user.id, system_instruction=system_prompt)
+            
+            await interaction.followup.send("*Chat session started. Type your next question or 'stop session' to end.*")
                 
         except Exception as e:
             await interaction.followup.send(f"❌ Error: {str(e)}")
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not isinstance(message.channel, discord.TextChannel):
-            return
+    async def continue_session(self, ctx: MessageContext) -> bool:
+        """Pipeline stage: while a session is open, the user's messages are their next questions."""
+        message = ctx.message
+        if not isinstance(message.channel, discord.TextChannel) or not self.conversations.is_active(message.author.id):
+            return False
 
-        if message.author.id in self.active_sessions and self.active_sessions[message.author.id]:
-            if message.content.lower() == "stop session":
-                self.active_sessions[message.author.id] = False
-                if message.author.id in self.conversation_history:
-                    del self.conversation_history[message.author.id]
-                await message.channel.send("Chat session ended. Use `/ask_kohii` to start a new one")
-                return
+        if ctx.lowered == "stop session":
+            self.conversations.end(message.author.id)
+            await message.channel.send("Chat session ended. Use `/ask_kohii` to start a new one")
+            return True
 
-            try:
-                thinking_msg = await message.channel.send("Pondering...")
-                
-                self.add_to_history(message.author.id, message.content)
-                
-                context = self.get_conversation_context(message.author.id)
-                
-                full_prompt = f"Previous conversation:\n{context}\n\nCurrent question: {message.content}"
-                
-                response = self.client.models.generate_content(
-                    model=self.model,
-                    contents=full_prompt
-                )
-                
-                self.add_to_history(message.author.id, response.text, is_user=False)
-                
-                response_chunks = self.split_response(response.text)
+        wait = self.bot.cooldowns.hit("gemini", message.author.id)
+        if wait:
+            await message.channel.send(f"You're asking too fast! Try again <t:{int(time.time() + wait)}:R>.")
+            return True
+
+        ticket = self.scheduler.submit(message.author.id)
+        try:
+            thinking_msg = await message.channel.send(self.queue_status(ticket))
+            await self.wait_for_turn(ticket, thinking_msg)
+            
+            contents = self.build_contents(message.author.id, message.content)
+            
+            reply = StreamingReply(thinking_msg, message.channel.send)
+            answer = await self.stream_reply(
+                reply, contents, self.conversations.system_instruction(message.author.id)
+            )
+            
+            self.add_to_history(message.author.id, message.content)
+            self.add_to_history(message.author.id, answer, is_user=False)
+            
+            await message.channel.send("*Type your next question or 'stop session' to end.*")
                 
+        except Exception as e:
+            if 'reply' in locals() and reply.parts:
+                # Keep the partial answer that was already streamed
+                await reply.finish()
+            elif 'thinking_msg' in locals():
                 await thinking_msg.delete()
-                
-                for chunk in response_chunks:
-                    await message.channel.send(chunk)
-                    await message.channel.send("*Type your next question or 'stop session' to end.*")
-                    
-            except Exception as e:
-                if 'thinking_msg' in locals():
-                    await thinking_msg.delete()
-                await message.channel.send(f"❌ Error: {str(e)}")
+            await message.channel.send(f"❌ Error: {str(e)}")
+        finally:
+            self.scheduler.release(ticket)
+        return True
+
+    @discord.app_commands.command(name="kohii_stats", description="Show Gemini queue and latency stats (owner only).")
+    async def kohii_stats(self, interaction: discord.Interaction):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("You do not have permission to view these stats.", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="Kohii Request Scheduler", color=discord.Color.blue())
+        embed.add_field(name="Running", value=f"{self.scheduler.running}/{self.scheduler.max_concurrency}", inline=True)
+        embed.add_field(name="Waiting", value=str(self.scheduler.waiting), inline=True)
+        embed.add_field(name="Queue wait", value=self.scheduler.queue_wait.format(), inline=False)
+        embed.add_field(name="Service time", value=self.scheduler.service_time.format(), inline=False)
+        memory = self.conversations.stats()
+        embed.add_field(name="Sessions", value=f"{memory['sessions']} ({memory['evictions']} evicted)", inline=True)
+        embed.add_field(name="History memory", value=f"{memory['resident_bytes'] / 1024:.1f} KiB", inline=True)
+        embed.add_field(
+            name="Avg prompt tokens",
+            value=f"{memory['avg_prompt_tokens']:.0f} ({memory['cached_token_ratio']:.0%} cached)",
+            inline=True,
+        )
+        cache = self.response_cache.stats
+        embed.add_field(
+            name="Response cache",
+            value=(
+                f"{len(self.response_cache.entries)} entries, {cache['hits']} hits, {cache['misses']} misses, "
+                f"{cache['coalesced']} coalesced, {cache['evictions']} evicted"
+            ),
+            inline=False,
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Gemini(bot)) 
\ No newline at end of file
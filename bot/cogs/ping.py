@@ -8,7 +8,10 @@ class Ping(commands.Cog):
     @discord.app_commands.command(name="ping", description="Check the bot's latency")
     async def pingg(self, interaction: discord.Interaction):
         latency = round(self.bot.latency * 1000)  # Convert latency to milliseconds
-        await interaction.response.send_message(f"Pong! {latency}ms")
+        lag = self.bot.loop_lag.summary()
+        await interaction.response.send_message(
+            f"Pong! {latency}ms (event loop lag p50 {lag['p50']:.1f}ms, p99 {lag['p99']:.1f}ms)"
+        )
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Ping(bot))
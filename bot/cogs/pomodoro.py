@@ -1,93 +1,192 @@
 import discord
 from discord.ext import commands
-import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+import time
+from datetime import datetime
+from typing import Dict, Any
+
+from utils.study_stats import summarize
+from utils.timers import DeadlineScheduler
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+STUDY = "study"
+BREAK = "break"
+
+
 class Pomodoro(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.use_mongodb = bot.use_mongodb
-        self.active_sessions: Dict[int, Dict[str, Any]] = {}  # Store active sessions in memory
-        
-        if self.use_mongodb:
-            self.collection = self.bot.mongo_client["kohii"]["pomodoro"]
-        else:
-            if "pomodoro_sessions" not in bot.in_memory_storage:
-                bot.in_memory_storage["pomodoro_sessions"] = {}
-
-    def get_session(self, user_id: int) -> Optional[Dict[str, Any]]:
-        if self.use_mongodb:
-            return self.collection.find_one({"user_id": user_id})
-        else:
-            return self.bot.in_memory_storage["pomodoro_sessions"].get(str(user_id))
-
-    def save_session(self, user_id: int, session_data: Dict[str, Any]) -> None:
-        if self.use_mongodb:
-            self.collection.update_one(
-                {"user_id": user_id},
-                {"$set": session_data},
-                upsert=True
+        # Running and paused timers by user ID; the storage copy is what survives restarts
+        self.active_sessions: Dict[int, Dict[str, Any]] = {}
+        self.timers = DeadlineScheduler(self.on_phase_end)
+
+    async def cog_load(self):
+        self.timers.start()
+        for timer in await self.bot.storage.get_pomodoro_timers():
+            self.active_sessions[timer["user_id"]] = timer
+            if timer["deadline"] is not None:
+                self.timers.schedule(timer["user_id"], timer["deadline"])
+
+    async def cog_unload(self):
+        self.timers.stop()
+
+    async def save_timer(self, timer: Dict[str, Any]) -> None:
+        await self.bot.storage.save_pomodoro_timer(timer["user_id"], timer)
+
+    async def record_session(self, user_id: int, session_data: Dict[str, Any]) -> None:
+        await self.bot.storage.record_pomodoro_session(user_id, session_data)
+
+    async def notify(self, timer: Dict[str, Any], content: str) -> None:
+        # Timers rehydrated at startup can fire before the gateway connects
+        await self.bot.wait_until_ready()
+        channel = self.bot.get_channel(timer["channel_id"])
+        try:
+            if channel is None:
+                channel = await self.bot.fetch_channel(timer["channel_id"])
+            await channel.send(content)
+        except discord.HTTPException as e:
+            logger.error(f"Could not notify {timer['user_id']} about their pomodoro: {e}")
+
+    def start_phase(self, timer: Dict[str, Any], phase: str) -> None:
+        minutes = timer["study_minutes"] if phase == STUDY else timer["break_minutes"]
+        timer["phase"] = phase
+        timer["phase_seconds"] = minutes * 60
+        timer["deadline"] = time.time() + minutes * 60
+        timer["remaining"] = None
+        self.timers.schedule(timer["user_id"], timer["deadline"])
+
+    def elapsed_in_phase(self, timer: Dict[str, Any]) -> float:
+        remaining = timer["remaining"] if timer["deadline"] is None else timer["deadline"] - time.time()
+        return max(0.0, timer["phase_seconds"] - remaining)
+
+    async def advance(self, timer: Dict[str, Any], focused_seconds: float) -> None:
+        """End the current phase: study moves to a break (or finishes), a break to study."""
+        user_id = timer["user_id"]
+        if timer["phase"] == STUDY:
+            timer["focus_seconds"] += focused_seconds
+            timer["cycles_completed"] += 1
+            if timer["cycles_completed"] >= timer["cycles"]:
+                await self.finish(timer, "completed")
+                await self.notify(
+                    timer,
+                    f"Pomodoro complete, <@{user_id}>! You focused for {round(timer['focus_seconds'] / 60)} minutes.",
+                )
+                return
+            self.start_phase(timer, BREAK)
+            await self.save_timer(timer)
+            await self.notify(
+                timer,
+                f"Time's up! Take a {timer['break_minutes']}-minute break, <@{user_id}>! "
+                f"({timer['cycles_completed']}/{timer['cycles']} done)",
             )
         else:
-            self.bot.in_memory_storage["pomodoro_sessions"][str(user_id)] = session_data
+            self.start_phase(timer, STUDY)
+            await self.save_timer(timer)
+            await self.notify(timer, f"Break's over, <@{user_id}>! Focus for {timer['study_minutes']} minutes.")
+
+    async def finish(self, timer: Dict[str, Any], status: str) -> None:
+        user_id = timer["user_id"]
+        self.timers.cancel(user_id)
+        self.active_sessions.pop(user_id, None)
+        await self.bot.storage.delete_pomodoro_timer(user_id)
+        await self.record_session(user_id, {
+            "user_id": user_id,
+            "start_time": datetime.utcfromtimestamp(timer["start_time"]),
+            "end_time": datetime.utcnow(),
+            "duration": round(timer["focus_seconds"] / 60),
+            "status": status,
+        })
+
+    async def on_phase_end(self, user_id: int) -> None:
+        timer = self.active_sessions.get(user_id)
+        # Skip may have already moved the timer on while this callback was queued
+        if timer is not None and timer["deadline"] is not None and timer["deadline"] <= time.time():
+            await self.advance(timer, timer["phase_seconds"])
 
     @commands.command(name="pomodoro")
-    async def pomodoro(self, ctx, duration: int = 25):
+    async def pomodoro(self, ctx, study: int = 25, short_break: int = 5, cycles: int = 4):
         if ctx.author.id in self.active_sessions:
             await ctx.send("You already have an active pomodoro session!")
             return
+        if min(study, short_break, cycles) < 1:
+            await ctx.send("Study time, break time and cycles must all be at least 1.")
+            return
 
-        session_data = {
+        timer = {
             "user_id": ctx.author.id,
-            "start_time": datetime.utcnow(),
-            "duration": duration,
-            "status": "active"
+            "channel_id": ctx.channel.id,
+            "study_minutes": study,
+            "break_minutes": short_break,
+            "cycles": cycles,
+            "cycles_completed": 0,
+            "focus_seconds": 0.0,
+            "start_time": time.time(),
         }
+        self.start_phase(timer, STUDY)
+        self.active_sessions[ctx.author.id] = timer
+        await self.save_timer(timer)
 
-        self.save_session(ctx.author.id, session_data)
-        self.active_sessions[ctx.author.id] = session_data
-
-        message = await ctx.send(f"Pomodoro session started! Focus for {duration} minutes.")
-        
-        await asyncio.sleep(duration * 60)
-        
-        if ctx.author.id in self.active_sessions:
-            await message.edit(content=f"Time's up! Take a 5-minute break, {ctx.author.mention}!")
-            
-            session_data["status"] = "completed"
-            session_data["end_time"] = datetime.utcnow()
-            self.save_session(ctx.author.id, session_data)
-            del self.active_sessions[ctx.author.id]
+        await ctx.send(
+            f"Pomodoro session started! Focus for {study} minutes "
+            f"({cycles} cycle{'s' if cycles != 1 else ''} with {short_break}-minute breaks)."
+        )
 
     @commands.command(name="stop")
     async def stop(self, ctx):
-        if ctx.author.id not in self.active_sessions:
+        timer = self.active_sessions.get(ctx.author.id)
+        if timer is None:
             await ctx.send("You don't have an active pomodoro session!")
             return
 
-        session_data = self.active_sessions[ctx.author.id]
-        session_data["status"] = "stopped"
-        session_data["end_time"] = datetime.utcnow()
-        
-        self.save_session(ctx.author.id, session_data)
-        del self.active_sessions[ctx.author.id]
-        
+        if timer["phase"] == STUDY:
+            timer["focus_seconds"] += self.elapsed_in_phase(timer)
+        await self.finish(timer, "stopped")
         await ctx.send("Pomodoro session stopped!")
 
+    @commands.command(name="skip")
+    async def skip(self, ctx):
+        timer = self.active_sessions.get(ctx.author.id)
+        if timer is None:
+            await ctx.send("You don't have an active pomodoro session!")
+            return
+
+        self.timers.cancel(ctx.author.id)
+        elapsed = self.elapsed_in_phase(timer)
+        await self.advance(timer, elapsed)
+
+    @commands.command(name="pause")
+    async def pause(self, ctx):
+        timer = self.active_sessions.get(ctx.author.id)
+        if timer is None or timer["deadline"] is None:
+            await ctx.send("You don't have a running pomodoro session to pause!")
+            return
+
+        self.timers.cancel(ctx.author.id)
+        timer["remaining"] = max(0.0, timer["deadline"] - time.time())
+        timer["deadline"] = None
+        await self.save_timer(timer)
+        await ctx.send(f"Paused with {round(timer['remaining'] / 60)} minutes left in this {timer['phase']}. Use `/resume` to continue.")
+
+    @commands.command(name="resume")
+    async def resume(self, ctx):
+        timer = self.active_sessions.get(ctx.author.id)
+        if timer is None or timer["deadline"] is not None:
+            await ctx.send("You don't have a paused pomodoro session!")
+            return
+
+        timer["deadline"] = time.time() + timer["remaining"]
+        timer["remaining"] = None
+        self.timers.schedule(ctx.author.id, timer["deadline"])
+        await self.save_timer(timer)
+        await ctx.send("Pomodoro resumed!")
+
     @discord.app_commands.command(name="session_history", description="View your Pomodoro session history.")
     async def session_history(self, interaction: discord.Interaction, limit: int = 5):
         user_id = interaction.user.id
-        collection = self.bot.mongo_client["kohii"]["pomodoro"]
-
-        sessions = list(
-            collection.find({"user_id": user_id}).sort("timestamp", -1).limit(limit)
-        )
+        sessions = await self.bot.storage.get_pomodoro_history(user_id, limit)
 
         if not sessions:
             await interaction.response.send_message("No session history found for your account.", ephemeral=True)
@@ -100,15 +199,40 @@ class Pomodoro(commands.Cog):
         )
 
         for session in sessions:
-            timestamp = session["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
-            work_sessions = session["work_sessions_completed"]
+            timestamp = session["start_time"].strftime("%Y-%m-%d %H:%M UTC")
             embed.add_field(
                 name=f"Session on {timestamp}",
-                value=f"Work Sessions Completed: **{work_sessions}**",
+                value=f"Focused **{session.get('duration') or 0} min** ({session.get('status', 'unknown')})",
                 inline=False,
             )
 
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
+    @discord.app_commands.command(name="study_stats", description="View your focus time and study streak.")
+    async def study_stats(self, interaction: discord.Interaction):
+        stats = await self.bot.storage.get_pomodoro_stats(interaction.user.id)
+        if not stats:
+            await interaction.response.send_message("No study stats yet. Start a session with `/pomodoro`!", ephemeral=True)
+            return
+
+        summary = summarize(stats, datetime.utcnow().date())
+        embed = discord.Embed(title="Study Stats", color=discord.Color.blue())
+        embed.add_field(name="Today", value=f"{summary['today_minutes']} min", inline=True)
+        embed.add_field(name="Last 7 days", value=f"{summary['week_minutes']} min", inline=True)
+        embed.add_field(name="All time", value=f"{summary['total_minutes']} min over {summary['sessions']} sessions", inline=True)
+        embed.add_field(name="Current streak", value=f"{summary['current_streak']} day(s)", inline=True)
+        embed.add_field(name="Longest streak", value=f"{summary['longest_streak']} day(s)", inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @commands.command(name="timerstats")
+    @commands.is_owner()
+    async def timer_stats(self, ctx):
+        """Show how many timers are running and how late their phase ends have fired."""
+        embed = discord.Embed(title="Pomodoro Timers", color=discord.Color.blue())
+        embed.add_field(name="Active sessions", value=str(len(self.active_sessions)), inline=True)
+        embed.add_field(name="Scheduled", value=str(len(self.timers)), inline=True)
+        embed.add_field(name="Wakeup lateness", value=self.timers.lateness.format("ms"), inline=False)
+        await ctx.send(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(Pomodoro(bot))
@@ -18,6 +18,8 @@ class Restart(commands.Cog):
         await interaction.response.send_message("Restarting bot...")
 
         await self.bot.close()
+        # execv skips main()'s cleanup, so save cooldowns here to keep them across the restart
+        await self.bot.cooldowns.close()
 
         os.execv(sys.executable, ["python"] + sys.argv)
 
@@ -1,27 +1,42 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-from datetime import datetime
-from typing import Dict, List, Any
-import re
-import os
+from typing import Dict, List, Any, Optional
+import asyncio
 import json
 
+from utils.matching import KeywordAutomaton
+from utils.message_pipeline import MessageContext
+from utils.persistence import atomic_write_json
+
+# Write-behind settings for swear_counts.json
+FLUSH_INTERVAL_SECONDS = 30
+FLUSH_THRESHOLD = 50
+
 class SwearJar(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.use_mongodb = getattr(bot, "use_mongodb", False)
         self.swear_words = self.load_swear_words()
-        
-        if self.use_mongodb and hasattr(bot, "mongo_client") and bot.mongo_client:
-            self.collection = bot.mongo_client["kohii"]["swear_counts"]
-        else:
-            self.use_mongodb = False
-            if "swear_counts" not in bot.in_memory_storage:
-                bot.in_memory_storage["swear_counts"] = {}
-                
+        self.swear_matcher = self.build_swear_matcher(self.swear_words)
+
         self.local_file_path = "swear_counts.json"
         self.load_local_counts()
+        self.pending_updates = 0
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+
+    async def cog_load(self):
+        self.flush_loop.start()
+        self.bot.message_pipeline.register("swear_jar", self.check_message, order=30)
+
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("swear_jar")
+        self.flush_loop.cancel()
+        await self.flush_local_counts()
+
+    @tasks.loop(seconds=FLUSH_INTERVAL_SECONDS)
+    async def flush_loop(self):
+        await self.flush_local_counts()
     
     def load_swear_words(self) -> List[str]:
         try:
@@ -30,6 +45,9 @@ class SwearJar(commands.Cog):
             return words
         except FileNotFoundError:
             return []
+
+    def build_swear_matcher(self, words: List[str]) -> KeywordAutomaton:
+        return KeywordAutomaton((word, None) for word in words)
     
     def load_local_counts(self):
         try:
@@ -38,44 +56,33 @@ class SwearJar(commands.Cog):
         except FileNotFoundError:
             self.local_counts = {}
     
-    def save_local_counts(self):
-        with open(self.local_file_path, "w", encoding="utf-8") as f:
-            json.dump(self.local_counts, f, indent=2)
-    
-    def count_swear_words(self, message: str) -> int:
-        message_lower = message.lower()
-        count = 0
-        for swear_word in self.swear_words:
-            pattern = r'\b' + re.escape(swear_word) + r'\b'
-            matches = len(re.findall(pattern, message_lower))
-            count += matches
-        return count
+    def mark_dirty(self):
+        self.pending_updates += 1
+        if self.pending_updates >= FLUSH_THRESHOLD and (self.flush_task is None or self.flush_task.done()):
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_local_counts())
+
+    async def flush_local_counts(self):
+        """Write pending count changes to disk off the event loop."""
+        async with self.flush_lock:
+            if not self.pending_updates:
+                return
+            # Snapshot on the loop so the writer thread never sees a dict mid-update
+            snapshot = {user_id: dict(data) for user_id, data in self.local_counts.items()}
+            flushed = self.pending_updates
+            self.pending_updates = 0
+            try:
+                await self.bot.storage.run(atomic_write_json, self.local_file_path, snapshot, indent=2)
+            except Exception as e:
+                self.pending_updates += flushed
+                print(f"Error saving swear counts: {e}")
     
     def update_user_count(self, user_id: int, username: str, count: int):
         user_id_str = str(user_id)
-        if self.use_mongodb:
-            self.collection.update_one(
-                {"user_id": user_id},
-                {
-                    "$inc": {"count": count},
-                    "$set": {
-                        "username": username,
-                        "last_updated": datetime.utcnow()
-                    }
-                },
-                upsert=True
-            )
-        else:
-            if user_id_str not in self.bot.in_memory_storage["swear_counts"]:
-                self.bot.in_memory_storage["swear_counts"][user_id_str] = {"count": 0, "username": username}
-            self.bot.in_memory_storage["swear_counts"][user_id_str]["count"] += count
-            self.bot.in_memory_storage["swear_counts"][user_id_str]["username"] = username
-        
         if user_id_str not in self.local_counts:
             self.local_counts[user_id_str] = {"count": 0, "username": username}
         self.local_counts[user_id_str]["count"] += count
         self.local_counts[user_id_str]["username"] = username
-        self.save_local_counts()
+        self.mark_dirty()
     
     def get_user_count(self, user_id: int) -> int:
         return self.local_counts.get(str(user_id), {}).get("count", 0)
@@ -91,16 +98,19 @@ class SwearJar(commands.Cog):
             for user_id, data in sorted_users[:limit]
         ]
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot:
-            return
-        
-        swear_count = self.count_swear_words(message.content)
+    async def check_message(self, ctx: MessageContext) -> None:
+        message = ctx.message
+        swear_count = self.swear_matcher.count(ctx.lowered)
         if swear_count > 0:
             self.update_user_count(message.author.id, str(message.author), swear_count)
             new_total = self.get_user_count(message.author.id)
-            await message.channel.send(f"{message.author.display_name.lower()}, your swear jar count is now {new_total}.")
+            # Coalesced per channel, so a flurry of swearing becomes one summary message
+            self.bot.output.notice(
+                message.channel,
+                "swear_jar",
+                message.author.id,
+                f"{message.author.display_name.lower()}, your swear jar count is now {new_total}.",
+            )
 
     # --- SLASH COMMANDS BELOW ---
 
@@ -129,9 +139,17 @@ class SwearJar(commands.Cog):
     @app_commands.command(name="reloadswears", description="Reload the swear words list (admin only).")
     @app_commands.checks.has_permissions(administrator=True)
     async def reload_swears(self, interaction: discord.Interaction):
+        await interaction.response.defer()
         old_count = len(self.swear_words)
-        self.swear_words = self.load_swear_words()
-        await interaction.response.send_message(f"Reloaded swear words list: {old_count} → {len(self.swear_words)} words")
+
+        def load():
+            words = self.load_swear_words()
+            return words, self.build_swear_matcher(words)
+
+        # Reading the file and building the automaton happen off the event loop;
+        # messages keep using the old matcher until the new one is swapped in
+        self.swear_words, self.swear_matcher = await self.bot.storage.run(load)
+        await interaction.followup.send(f"Reloaded swear words list: {old_count} → {len(self.swear_words)} words")
 
     
 
@@ -1,19 +1,14 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
+from typing import Optional
 
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Read from .env and convert to int
-CHANNEL_ID = int(os.getenv("WELCOME_CHANNEL_ID"))
+from utils.guild_config import WELCOME_MESSAGE
 
 
 class Welcome(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.welcome_channel_id = CHANNEL_ID
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
@@ -22,16 +17,41 @@ class Welcome(commands.Cog):
         if member.bot:
             return
 
-        channel = member.guild.get_channel(self.welcome_channel_id)
+        # Set per guild with /set_welcome or /welcome_off; WELCOME_CHANNEL_ID is the default
+        config = self.bot.guild_configs.get(member.guild.id)
+        if config["welcome_channel_id"] is None:
+            return
+
+        channel = member.guild.get_channel(config["welcome_channel_id"])
 
         if channel is None:
-            print(f"Channel with ID {self.welcome_channel_id} not found")
+            print(f"Channel with ID {config['welcome_channel_id']} not found")
             return
 
         try:
-            await channel.send(f"welcome {member.mention}")
+            await channel.send(config["welcome_message"].replace("{mention}", member.mention))
         except discord.Forbidden:
             print(f"Missing permissions in {channel.name}")
 
+    @app_commands.command(name="set_welcome", description="Set this server's welcome channel and message (admin only).")
+    @app_commands.describe(message=f"Use {{mention}} for the new member (default: {WELCOME_MESSAGE})")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def set_welcome(self, interaction: discord.Interaction, channel: discord.TextChannel, message: Optional[str] = None):
+        def apply(config):
+            config["welcome_channel_id"] = channel.id
+            if message:
+                config["welcome_message"] = message
+
+        await self.bot.guild_configs.update(interaction.guild_id, apply)
+        await interaction.response.send_message(f"New members will be welcomed in {channel.mention}.", ephemeral=True)
+
+    @app_commands.command(name="welcome_off", description="Stop welcoming new members in this server (admin only).")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def welcome_off(self, interaction: discord.Interaction):
+        await self.bot.guild_configs.update(interaction.guild_id, lambda config: config.update(welcome_channel_id=None))
+        await interaction.response.send_message("Welcome messages are off.", ephemeral=True)
+
 async def setup(bot: commands.Bot):
-    await bot.add_cog(Welcome(bot))
\ No newline at end of file
+    await bot.add_cog(Welcome(bot))
@@ -0,0 +1,8 @@
+from .async_storage import AsyncStorage
+from .base import StorageBackend
+from .memory import MemoryBackend
+from .mongo import MongoBackend
+from .sqlite import SQLiteBackend
+
+
+__all__ = ["AsyncStorage", "MemoryBackend", "MongoBackend", "SQLiteBackend", "StorageBackend"]
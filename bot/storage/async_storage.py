@@ -0,0 +1,76 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .base import StorageBackend
+
+
+class AsyncStorage:
+    """Async front for a `StorageBackend`, hung off the bot as `bot.storage`.
+
+    Backend methods are available as coroutines, e.g.
+    `await bot.storage.get_user_messages(user_id)`. Blocking backends run on
+    a dedicated, bounded thread pool so database latency only ever parks a
+    worker thread. At most `max_pending` calls may be queued or running at
+    once; further callers wait their turn instead of growing the executor
+    queue without bound.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        max_workers: int = 8,
+        max_pending: int = 256,
+        simulated_latency: float = 0.0,
+    ):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        # Artificial per-call delay for load-testing the loop under a slow database
+        self.simulated_latency = simulated_latency
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+
+    def _call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        if self.simulated_latency:
+            time.sleep(self.simulated_latency)
+        return func(*args, **kwargs)
+
+    async def run(self, func: Callable[..., Any], *args, offload: bool = True, **kwargs) -> Any:
+        """Call `func` on the storage pool; `offload=False` calls it inline."""
+        if not offload:
+            return func(*args, **kwargs)
+
+        if self._semaphore is None:
+            # Created lazily so it binds to the running loop, not import time
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self.executor, functools.partial(self._call, func, *args, **kwargs)
+                )
+            finally:
+                self.in_flight -= 1
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_") or "backend" not in self.__dict__:
+            raise AttributeError(name)
+        method = getattr(self.backend, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, offload=self.backend.blocking, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.backend.close()
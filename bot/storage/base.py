@@ -0,0 +1,92 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class StorageBackend:
+    """Persistence interface shared by every cog.
+
+    Methods are plain blocking calls. Backends whose calls do real I/O set
+    `blocking = True` and `AsyncStorage` runs them on its thread pool; the
+    in-memory backend runs inline on the event loop.
+    """
+
+    name = "base"
+    blocking = True
+
+    def setup(self) -> None:
+        """Create tables/indexes. Called once before the cogs load."""
+
+    def close(self) -> None:
+        """Release connections."""
+
+    # --- chat logs ---
+
+    def insert_chat_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """Store a batch of messages; returns how many were written."""
+        raise NotImplementedError
+
+    def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def search_messages(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest messages containing `keyword` as a whole-word phrase."""
+        raise NotImplementedError
+
+    def get_recent_messages(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest messages first; /regexsearch matches these itself, in a separate process."""
+        raise NotImplementedError
+
+    def describe_query_plans(self) -> Dict[str, str]:
+        """Human-readable plans for the chat-log and session-history queries, if the backend has them."""
+        return {}
+
+    # --- pomodoro ---
+
+    def record_pomodoro_session(self, user_id: int, session_data: Dict[str, Any]) -> None:
+        """Append a finished session to the history and fold it into the user's stats rollup."""
+        raise NotImplementedError
+
+    def get_pomodoro_history(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        """Most recent sessions first."""
+        raise NotImplementedError
+
+    def get_pomodoro_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """The rollup kept by `utils.study_stats.apply_session`, or None."""
+        raise NotImplementedError
+
+    def get_pomodoro_timers(self) -> List[Dict[str, Any]]:
+        """Every running or paused timer, for rescheduling after a restart."""
+        raise NotImplementedError
+
+    def save_pomodoro_timer(self, user_id: int, timer: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete_pomodoro_timer(self, user_id: int) -> None:
+        raise NotImplementedError
+
+    # --- coffee collection ---
+
+    def add_coffee_cards(self, user_id: str, card_ids: List[int], discord_name: str) -> None:
+        """Add one copy of each card to the user's inventory in a single upsert."""
+        raise NotImplementedError
+
+    def get_coffee_inventory(self, user_id: str) -> Tuple[Dict[int, int], Optional[str]]:
+        """Returns `({card_id: count}, discord_name)`; the name is None for unknown users."""
+        raise NotImplementedError
+
+    def get_coffee_leaderboard(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Top collectors as `{"discord_id", "discord_name", "total"}`, most cards first."""
+        raise NotImplementedError
+
+    # --- guild config ---
+
+    def get_guild_configs(self, guild_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Saved configs as `{"guild_id", "version", **config}`; every guild's when `guild_ids` is None."""
+        raise NotImplementedError
+
+    def get_guild_config_versions(self) -> Dict[int, int]:
+        """`{guild_id: version}` for every saved config; cheap enough to poll."""
+        raise NotImplementedError
+
+    def save_guild_config(self, guild_id: int, config: Dict[str, Any]) -> int:
+        """Replace a guild's config and bump its version; returns the new version."""
+        raise NotImplementedError
@@ -0,0 +1,93 @@
+import heapq
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from utils.chat_store import InMemoryChatLogStore
+from utils.study_stats import apply_session
+
+from .base import StorageBackend
+
+
+class MemoryBackend(StorageBackend):
+    """Process-local storage used when no database is configured; lost on restart."""
+
+    name = "in-memory"
+    blocking = False
+
+    def __init__(self, max_chat_messages: int = 50000, max_sessions_per_user: int = 500):
+        self.chat_logs = InMemoryChatLogStore(max_messages=max_chat_messages)
+        self.max_sessions_per_user = max_sessions_per_user
+        self.pomodoro_history: Dict[int, Deque[Dict[str, Any]]] = {}
+        self.pomodoro_stats: Dict[int, Dict[str, Any]] = {}
+        self.pomodoro_timers: Dict[int, Dict[str, Any]] = {}
+        self.coffee_collections: Dict[str, Dict[str, Any]] = {}
+        self.guild_configs: Dict[int, Dict[str, Any]] = {}
+
+    def insert_chat_messages(self, messages: List[Dict[str, Any]]) -> int:
+        self.chat_logs.extend(messages)
+        return len(messages)
+
+    def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        return self.chat_logs.get_user_messages(user_id, limit)
+
+    def search_messages(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+        return self.chat_logs.search(keyword, limit)
+
+    def get_recent_messages(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return self.chat_logs.get_recent_messages(limit)
+
+    def record_pomodoro_session(self, user_id: int, session_data: Dict[str, Any]) -> None:
+        history = self.pomodoro_history.get(user_id)
+        if history is None:
+            history = self.pomodoro_history[user_id] = deque(maxlen=self.max_sessions_per_user)
+        history.append(dict(session_data))
+        self.pomodoro_stats[user_id] = apply_session(
+            self.pomodoro_stats.get(user_id), session_data["end_time"].date(), session_data["duration"]
+        )
+
+    def get_pomodoro_history(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        history = self.pomodoro_history.get(user_id, ())
+        return [history[-i] for i in range(1, min(limit, len(history)) + 1)]
+
+    def get_pomodoro_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self.pomodoro_stats.get(user_id)
+
+    def get_pomodoro_timers(self) -> List[Dict[str, Any]]:
+        return [dict(timer) for timer in self.pomodoro_timers.values()]
+
+    def save_pomodoro_timer(self, user_id: int, timer: Dict[str, Any]) -> None:
+        self.pomodoro_timers[user_id] = dict(timer)
+
+    def delete_pomodoro_timer(self, user_id: int) -> None:
+        self.pomodoro_timers.pop(user_id, None)
+
+    def add_coffee_cards(self, user_id: str, card_ids: List[int], discord_name: str) -> None:
+        user_data = self.coffee_collections.setdefault(str(user_id), {"inventory": Counter(), "total": 0})
+        user_data["inventory"].update(card_ids)
+        user_data["total"] += len(card_ids)
+        user_data["discord_name"] = discord_name
+
+    def get_coffee_inventory(self, user_id: str) -> Tuple[Dict[int, int], Optional[str]]:
+        user_data = self.coffee_collections.get(str(user_id))
+        if user_data is None:
+            return {}, None
+        return dict(user_data["inventory"]), user_data["discord_name"]
+
+    def get_coffee_leaderboard(self, limit: int = 10) -> List[Dict[str, Any]]:
+        top = heapq.nlargest(limit, self.coffee_collections.items(), key=lambda item: item[1]["total"])
+        return [
+            {"discord_id": user_id, "discord_name": data["discord_name"], "total": data["total"]}
+            for user_id, data in top
+        ]
+
+    def get_guild_configs(self, guild_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        wanted = self.guild_configs.keys() if guild_ids is None else guild_ids
+        return [dict(self.guild_configs[guild_id]) for guild_id in wanted if guild_id in self.guild_configs]
+
+    def get_guild_config_versions(self) -> Dict[int, int]:
+        return {guild_id: config["version"] for guild_id, config in self.guild_configs.items()}
+
+    def save_guild_config(self, guild_id: int, config: Dict[str, Any]) -> int:
+        version = self.guild_configs.get(guild_id, {}).get("version", 0) + 1
+        self.guild_configs[guild_id] = {**config, "guild_id": guild_id, "version": version}
+        return version
@@ -0,0 +1,186 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, TEXT, MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from utils.study_stats import apply_session
+
+from .base import StorageBackend
+
+
+def text_phrase_query(keyword: str) -> Dict[str, Any]:
+    # Quoted so multi-word keywords match as a phrase, like the in-memory index
+    phrase = keyword.replace('"', " ")
+    return {"$text": {"$search": f'"{phrase}"'}}
+
+
+class MongoBackend(StorageBackend):
+    name = "MongoDB"
+    blocking = True
+
+    def __init__(self, client: MongoClient):
+        self.client = client
+        self.chat_logs = client["kohii"]["user_messages"]
+        self.pomodoro = client["kohii"]["pomodoro"]
+        self.pomodoro_timers = client["kohii"]["pomodoro_timers"]
+        self.pomodoro_stats = client["kohii"]["pomodoro_stats"]
+        self.guild_configs = client["kohii"]["guild_configs"]
+        self.user_collections = client["coffee_bot"]["user_collections"]
+
+    def setup(self) -> None:
+        """Create the indexes /mylogs, /search and /regexsearch rely on; no-op if they exist."""
+        try:
+            self.chat_logs.create_index(
+                [("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_timestamp"
+            )
+            self.chat_logs.create_index(
+                [("guild_id", ASCENDING), ("channel_id", ASCENDING), ("timestamp", DESCENDING)],
+                name="guild_channel_timestamp",
+            )
+            self.chat_logs.create_index([("timestamp", DESCENDING)], name="timestamp")
+            self.chat_logs.create_index([("content", TEXT)], name="content_text")
+        except OperationFailure as e:
+            print(f"Error creating chat log indexes: {e}")
+        try:
+            self.pomodoro.create_index([("user_id", ASCENDING), ("start_time", DESCENDING)], name="user_start_time")
+            self.pomodoro_timers.create_index([("user_id", ASCENDING)], name="user_id", unique=True)
+            self.pomodoro_stats.create_index([("user_id", ASCENDING)], name="user_id", unique=True)
+        except OperationFailure as e:
+            print(f"Error creating pomodoro indexes: {e}")
+        try:
+            self.guild_configs.create_index([("guild_id", ASCENDING)], name="guild_id", unique=True)
+        except OperationFailure as e:
+            print(f"Error creating guild config indexes: {e}")
+        # Separate tries so a conflicting discord_id index doesn't skip the leaderboard's
+        try:
+            self.user_collections.create_index([("discord_id", ASCENDING)], name="discord_id")
+        except OperationFailure as e:
+            print(f"Error creating coffee collection discord_id index: {e}")
+        try:
+            self.user_collections.create_index([("total", DESCENDING)], name="total")
+        except OperationFailure as e:
+            print(f"Error creating coffee collection total index: {e}")
+
+    def close(self) -> None:
+        self.client.close()
+
+    def insert_chat_messages(self, messages: List[Dict[str, Any]]) -> int:
+        try:
+            self.chat_logs.insert_many(messages, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            print(f"Failed to log {len(errors)} of {len(messages)} messages: {errors[:1]}")
+            return len(messages) - len(errors)
+        return len(messages)
+
+    def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        return list(self.chat_logs.find(
+            {"user_id": user_id}
+        ).sort("timestamp", -1).limit(limit))
+
+    def search_messages(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+        try:
+            return list(self.chat_logs.find(
+                text_phrase_query(keyword)
+            ).sort("timestamp", -1).limit(limit))
+        except OperationFailure as e:
+            # Text index missing or still building
+            print(f"Text search failed, falling back to regex: {e}")
+        # Unanchored regex scans the whole collection; only used as a fallback
+        return list(self.chat_logs.find(
+            {"content": {"$regex": keyword, "$options": "i"}}
+        ).sort("timestamp", -1).limit(limit).max_time_ms(5000))
+
+    def get_recent_messages(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return list(self.chat_logs.find().sort("timestamp", -1).limit(limit))
+
+    def describe_query_plans(self) -> Dict[str, str]:
+        """Winning-plan stages for the /mylogs, /search and /session_history queries."""
+        queries = {
+            "mylogs": self.chat_logs.find({"user_id": 0}).sort("timestamp", -1).limit(10),
+            "search": self.chat_logs.find(text_phrase_query("kohii")).sort("timestamp", -1).limit(10),
+            "session_history": self.pomodoro.find({"user_id": 0}).sort("start_time", -1).limit(5),
+        }
+        plans = {}
+        for name, cursor in queries.items():
+            stages = []
+            winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+            # Slot-based engine (MongoDB 7+) nests the classic plan under queryPlan
+            stage = winning_plan.get("queryPlan", winning_plan)
+            while stage:
+                stages.append(stage.get("stage", "?"))
+                stage = stage.get("inputStage") or (stage.get("inputStages") or [None])[0]
+            plans[name] = " <- ".join(stages)
+        return plans
+
+    def record_pomodoro_session(self, user_id: int, session_data: Dict[str, Any]) -> None:
+        self.pomodoro.insert_one({**session_data, "user_id": user_id})
+        # One writer per user (a user has at most one session running), so read-modify-write is safe
+        stats = apply_session(
+            self.get_pomodoro_stats(user_id), session_data["end_time"].date(), session_data["duration"]
+        )
+        self.pomodoro_stats.replace_one({"user_id": user_id}, {**stats, "user_id": user_id}, upsert=True)
+
+    def get_pomodoro_history(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        return list(
+            self.pomodoro.find({"user_id": user_id}, {"_id": 0}).sort("start_time", DESCENDING).limit(limit)
+        )
+
+    def get_pomodoro_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self.pomodoro_stats.find_one({"user_id": user_id}, {"_id": 0, "user_id": 0})
+
+    def get_pomodoro_timers(self) -> List[Dict[str, Any]]:
+        return list(self.pomodoro_timers.find({}, {"_id": 0}))
+
+    def save_pomodoro_timer(self, user_id: int, timer: Dict[str, Any]) -> None:
+        self.pomodoro_timers.replace_one({"user_id": user_id}, {**timer, "user_id": user_id}, upsert=True)
+
+    def delete_pomodoro_timer(self, user_id: int) -> None:
+        self.pomodoro_timers.delete_one({"user_id": user_id})
+
+    def add_coffee_cards(self, user_id: str, card_ids: List[int], discord_name: str) -> None:
+        # Counts live under inventory.<card_id>, so a drop is one upsert whatever the collection size
+        increments: Dict[str, int] = {"total": len(card_ids)}
+        for card_id in card_ids:
+            field = f"inventory.{card_id}"
+            increments[field] = increments.get(field, 0) + 1
+        self.user_collections.update_one(
+            {"discord_id": str(user_id)},
+            {"$inc": increments, "$set": {"discord_name": discord_name}},
+            upsert=True,
+        )
+
+    def get_coffee_inventory(self, user_id: str) -> Tuple[Dict[int, int], Optional[str]]:
+        user = self.user_collections.find_one(
+            {"discord_id": str(user_id)}, {"_id": 0, "inventory": 1, "discord_name": 1}
+        )
+        if not user:
+            return {}, None
+        inventory = {int(card_id): count for card_id, count in user.get("inventory", {}).items()}
+        return inventory, user.get("discord_name", f"User_{user_id}")
+
+    def get_coffee_leaderboard(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return list(
+            self.user_collections.find(
+                {"total": {"$gt": 0}}, {"_id": 0, "discord_id": 1, "discord_name": 1, "total": 1}
+            ).sort("total", DESCENDING).limit(limit)
+        )
+
+    def get_guild_configs(self, guild_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        query = {} if guild_ids is None else {"guild_id": {"$in": list(guild_ids)}}
+        return [
+            {**doc["config"], "guild_id": doc["guild_id"], "version": doc["version"]}
+            for doc in self.guild_configs.find(query, {"_id": 0})
+        ]
+
+    def get_guild_config_versions(self) -> Dict[int, int]:
+        return {doc["guild_id"]: doc["version"] for doc in self.guild_configs.find({}, {"_id": 0, "guild_id": 1, "version": 1})}
+
+    def save_guild_config(self, guild_id: int, config: Dict[str, Any]) -> int:
+        doc = self.guild_configs.find_one_and_update(
+            {"guild_id": guild_id},
+            {"$set": {"config": config}, "$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["version"]
@@ -0,0 +1,323 @@
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.study_stats import apply_session
+
+from .base import StorageBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_logs (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    content TEXT NOT NULL,
+    channel_id INTEGER,
+    channel_name TEXT,
+    guild_id INTEGER,
+    guild_name TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_logs_user_timestamp ON chat_logs (user_id, timestamp DESC);
+CREATE INDEX IF NOT EXISTS chat_logs_guild_channel_timestamp ON chat_logs (guild_id, channel_id, timestamp DESC);
+CREATE INDEX IF NOT EXISTS chat_logs_timestamp ON chat_logs (timestamp DESC);
+
+CREATE TABLE IF NOT EXISTS pomodoro_history (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    duration INTEGER,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS pomodoro_history_user_start ON pomodoro_history (user_id, start_time DESC);
+
+CREATE TABLE IF NOT EXISTS pomodoro_stats (
+    user_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL
+);
+
+-- Timer state is opaque to queries, so it is stored as JSON
+CREATE TABLE IF NOT EXISTS pomodoro_timers (
+    user_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS coffee_collectors (
+    discord_id TEXT PRIMARY KEY,
+    discord_name TEXT,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS coffee_collectors_total ON coffee_collectors (total DESC);
+
+CREATE TABLE IF NOT EXISTS coffee_inventory (
+    discord_id TEXT NOT NULL,
+    card_id INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (discord_id, card_id)
+) WITHOUT ROWID;
+
+-- Per-guild trigger and welcome settings as JSON; version bumps on every save
+CREATE TABLE IF NOT EXISTS guild_configs (
+    guild_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL,
+    config TEXT NOT NULL
+);
+"""
+
+# External-content FTS table kept in sync by trigger; needs SQLite built with FTS5
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_logs_fts USING fts5(content, content='chat_logs', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS chat_logs_fts_insert AFTER INSERT ON chat_logs BEGIN
+    INSERT INTO chat_logs_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS chat_logs_fts_delete AFTER DELETE ON chat_logs BEGIN
+    INSERT INTO chat_logs_fts (chat_logs_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+CHAT_COLUMNS = "c.user_id, c.username, c.content, c.channel_id, c.channel_name, c.guild_id, c.guild_name, c.timestamp"
+
+
+def to_text(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def from_text(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+class SQLiteBackend(StorageBackend):
+    """Single-file storage in WAL mode for deployments without MongoDB.
+
+    Each storage worker thread gets its own connection, so reads run
+    concurrently with the single writer that WAL allows.
+    """
+
+    name = "SQLite"
+    blocking = True
+
+    def __init__(self, path: str = "kohii.db"):
+        self.path = path
+        self.has_fts = False
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def setup(self) -> None:
+        with self.conn as conn:
+            conn.executescript(SCHEMA)
+        try:
+            with self.conn as conn:
+                conn.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            print(f"SQLite FTS5 unavailable, /search will scan: {e}")
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    @staticmethod
+    def _chat_row(row: sqlite3.Row) -> Dict[str, Any]:
+        message = dict(row)
+        message["timestamp"] = from_text(message["timestamp"])
+        return message
+
+    def insert_chat_messages(self, messages: List[Dict[str, Any]]) -> int:
+        rows = [
+            (
+                msg["user_id"], msg.get("username"), msg["content"], msg.get("channel_id"),
+                msg.get("channel_name"), msg.get("guild_id"), msg.get("guild_name"), to_text(msg["timestamp"]),
+            )
+            for msg in messages
+        ]
+        # One transaction per batch instead of one per message
+        with self.conn as conn:
+            conn.executemany(
+                "INSERT INTO chat_logs (user_id, username, content, channel_id, channel_name, guild_id, guild_name, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            f"SELECT {CHAT_COLUMNS} FROM chat_logs c WHERE c.user_id = ? ORDER BY c.timestamp DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        return [self._chat_row(row) for row in rows]
+
+    def search_messages(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+        if self.has_fts and re.search(r"\w", keyword):
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            rows = self.conn.execute(
+                f"SELECT {CHAT_COLUMNS} FROM chat_logs_fts f JOIN chat_logs c ON c.id = f.rowid "
+                "WHERE chat_logs_fts MATCH ? ORDER BY c.timestamp DESC LIMIT ?",
+                (phrase, limit),
+            ).fetchall()
+        else:
+            escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            rows = self.conn.execute(
+                f"SELECT {CHAT_COLUMNS} FROM chat_logs c WHERE c.content LIKE ? ESCAPE '\\' "
+                "ORDER BY c.timestamp DESC LIMIT ?",
+                (f"%{escaped}%", limit),
+            ).fetchall()
+        return [self._chat_row(row) for row in rows]
+
+    def get_recent_messages(self, limit: int = 10) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            f"SELECT {CHAT_COLUMNS} FROM chat_logs c ORDER BY c.timestamp DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [self._chat_row(row) for row in rows]
+
+    def describe_query_plans(self) -> Dict[str, str]:
+        queries = {
+            "mylogs": (
+                f"SELECT {CHAT_COLUMNS} FROM chat_logs c WHERE c.user_id = ? ORDER BY c.timestamp DESC LIMIT 10",
+                (0,),
+            ),
+            "session_history": (
+                "SELECT user_id, start_time, end_time, duration, status FROM pomodoro_history "
+                "WHERE user_id = ? ORDER BY start_time DESC LIMIT 5",
+                (0,),
+            ),
+        }
+        if self.has_fts:
+            queries["search"] = (
+                f"SELECT {CHAT_COLUMNS} FROM chat_logs_fts f JOIN chat_logs c ON c.id = f.rowid "
+                "WHERE chat_logs_fts MATCH ? ORDER BY c.timestamp DESC LIMIT 10",
+                ('"kohii"',),
+            )
+        return {
+            name: " / ".join(row["detail"] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+            for name, (sql, params) in queries.items()
+        }
+
+    @staticmethod
+    def _session_row(row: sqlite3.Row) -> Dict[str, Any]:
+        session = dict(row)
+        session["start_time"] = from_text(session["start_time"])
+        session["end_time"] = from_text(session["end_time"])
+        if session["end_time"] is None:
+            del session["end_time"]
+        return session
+
+    def record_pomodoro_session(self, user_id: int, session_data: Dict[str, Any]) -> None:
+        stats = apply_session(
+            self.get_pomodoro_stats(user_id), session_data["end_time"].date(), session_data["duration"]
+        )
+        with self.conn as conn:
+            conn.execute(
+                "INSERT INTO pomodoro_history (user_id, start_time, end_time, duration, status) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    user_id, to_text(session_data["start_time"]), to_text(session_data.get("end_time")),
+                    session_data.get("duration"), session_data.get("status"),
+                ),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO pomodoro_stats (user_id, state) VALUES (?, ?)", (user_id, json.dumps(stats))
+            )
+
+    def get_pomodoro_history(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT user_id, start_time, end_time, duration, status FROM pomodoro_history "
+            "WHERE user_id = ? ORDER BY start_time DESC LIMIT ?",
+            (user_id, limit),
+        ).fetchall()
+        return [self._session_row(row) for row in rows]
+
+    def get_pomodoro_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT state FROM pomodoro_stats WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row["state"]) if row else None
+
+    def get_pomodoro_timers(self) -> List[Dict[str, Any]]:
+        return [json.loads(row["state"]) for row in self.conn.execute("SELECT state FROM pomodoro_timers")]
+
+    def save_pomodoro_timer(self, user_id: int, timer: Dict[str, Any]) -> None:
+        with self.conn as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pomodoro_timers (user_id, state) VALUES (?, ?)", (user_id, json.dumps(timer))
+            )
+
+    def delete_pomodoro_timer(self, user_id: int) -> None:
+        with self.conn as conn:
+            conn.execute("DELETE FROM pomodoro_timers WHERE user_id = ?", (user_id,))
+
+    def add_coffee_cards(self, user_id: str, card_ids: List[int], discord_name: str) -> None:
+        with self.conn as conn:
+            conn.execute(
+                "INSERT INTO coffee_collectors (discord_id, discord_name, total) VALUES (?, ?, ?) "
+                "ON CONFLICT (discord_id) DO UPDATE SET total = total + excluded.total, "
+                "discord_name = excluded.discord_name",
+                (str(user_id), discord_name, len(card_ids)),
+            )
+            conn.executemany(
+                "INSERT INTO coffee_inventory (discord_id, card_id, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (discord_id, card_id) DO UPDATE SET count = count + 1",
+                [(str(user_id), card_id) for card_id in card_ids],
+            )
+
+    def get_coffee_inventory(self, user_id: str) -> Tuple[Dict[int, int], Optional[str]]:
+        collector = self.conn.execute(
+            "SELECT discord_name FROM coffee_collectors WHERE discord_id = ?", (str(user_id),)
+        ).fetchone()
+        if collector is None:
+            return {}, None
+        rows = self.conn.execute(
+            "SELECT card_id, count FROM coffee_inventory WHERE discord_id = ?", (str(user_id),)
+        ).fetchall()
+        return {row["card_id"]: row["count"] for row in rows}, collector["discord_name"]
+
+    def get_coffee_leaderboard(self, limit: int = 10) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT discord_id, discord_name, total FROM coffee_collectors WHERE total > 0 "
+            "ORDER BY total DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_guild_configs(self, guild_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        if guild_ids is None:
+            rows = self.conn.execute("SELECT guild_id, version, config FROM guild_configs").fetchall()
+        else:
+            placeholders = ", ".join("?" * len(guild_ids))
+            rows = self.conn.execute(
+                f"SELECT guild_id, version, config FROM guild_configs WHERE guild_id IN ({placeholders})",
+                list(guild_ids),
+            ).fetchall()
+        return [{**json.loads(row["config"]), "guild_id": row["guild_id"], "version": row["version"]} for row in rows]
+
+    def get_guild_config_versions(self) -> Dict[int, int]:
+        return {row["guild_id"]: row["version"] for row in self.conn.execute("SELECT guild_id, version FROM guild_configs")}
+
+    def save_guild_config(self, guild_id: int, config: Dict[str, Any]) -> int:
+        with self.conn as conn:
+            conn.execute(
+                "INSERT INTO guild_configs (guild_id, version, config) VALUES (?, 1, ?) "
+                "ON CONFLICT (guild_id) DO UPDATE SET version = version + 1, config = excluded.config",
+                (guild_id, json.dumps(config)),
+            )
+            row = conn.execute("SELECT version FROM guild_configs WHERE guild_id = ?", (guild_id,)).fetchone()
+        return row["version"]
@@ -0,0 +1,134 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class BatchWriter:
+    """Bounded async queue drained in batches by a single background task.
+
+    `write_batch` receives a list of items and may return how many of them
+    were written; returning None counts the whole batch as flushed. When
+    `blocking` is true the callable is handed to `runner` (a worker thread
+    by default) so slow drivers never stall the event loop. Items submitted
+    while the queue is full are dropped and counted rather than applying
+    backpressure to the caller.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Any]], Optional[int]],
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        blocking: bool = True,
+        runner: Optional[Callable[..., Awaitable[Any]]] = None,
+        name: str = "batch-writer",
+    ):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.blocking = blocking
+        self.runner = runner or asyncio.to_thread
+        self.name = name
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.stats: Dict[str, int] = {
+            "enqueued": 0,
+            "dropped": 0,
+            "flushed": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+        self._batch: List[Any] = []
+        self._task: Optional[asyncio.Task] = None
+        self._idle = False
+        self._closing = False
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() + len(self._batch)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "depth": self.depth}
+
+    def submit(self, item: Any) -> bool:
+        if self._closing:
+            self.stats["dropped"] += 1
+            return False
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.get_running_loop().create_task(self._run(), name=self.name)
+
+    async def close(self) -> None:
+        """Stop accepting items and write everything still queued."""
+        self._closing = True
+        if self._task is not None:
+            if self._idle:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while not self.queue.empty():
+            self._batch.append(self.queue.get_nowait())
+            if len(self._batch) >= self.batch_size:
+                await self._flush()
+        if self._batch:
+            await self._flush()
+
+    async def _get(self, timeout: Optional[float] = None) -> Any:
+        self._idle = True
+        try:
+            if timeout is None:
+                return await self.queue.get()
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        finally:
+            self._idle = False
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._closing:
+            self._batch.append(await self._get())
+            deadline = loop.time() + self.flush_interval
+
+            while len(self._batch) < self.batch_size:
+                try:
+                    self._batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0 or self._closing:
+                    break
+                try:
+                    self._batch.append(await self._get(timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush()
+
+    async def _flush(self) -> None:
+        batch, self._batch = self._batch, []
+        try:
+            if self.blocking:
+                written = await self.runner(self.write_batch, batch)
+            else:
+                written = self.write_batch(batch)
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            print(f"Error writing batch in {self.name}: {e}")
+            return
+
+        written = len(batch) if written is None else written
+        self.stats["flushed"] += written
+        self.stats["failed"] += len(batch) - written
+        self.stats["batches"] += 1
@@ -0,0 +1,93 @@
+import re
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, Hashable, Iterable, List, Set
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+class InMemoryChatLogStore:
+    """Bounded, indexed chat-log store used when MongoDB is unavailable.
+
+    Messages are appended in arrival order, so every index is a deque that is
+    already sorted oldest to newest: lookups read from the right end and
+    eviction pops from the left end of each index the evicted message is in.
+    """
+
+    def __init__(self, max_messages: int = 50000):
+        self.max_messages = max_messages
+        self.messages: Deque[Dict[str, Any]] = deque()
+        self.by_user: Dict[int, Deque[Dict[str, Any]]] = {}
+        self.by_channel: Dict[Hashable, Deque[Dict[str, Any]]] = {}
+        self.postings: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._message_tokens: Deque[Set[str]] = deque()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    @staticmethod
+    def _append(index: Dict[Hashable, Deque[Dict[str, Any]]], key: Hashable, message: Dict[str, Any]):
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index[key] = deque()
+        bucket.append(message)
+
+    @staticmethod
+    def _pop_oldest(index: Dict[Hashable, Deque[Dict[str, Any]]], key: Hashable):
+        bucket = index[key]
+        bucket.popleft()
+        if not bucket:
+            del index[key]
+
+    def add(self, message: Dict[str, Any]) -> None:
+        tokens = tokenize(message["content"])
+        self.messages.append(message)
+        self._message_tokens.append(tokens)
+        self._append(self.by_user, message["user_id"], message)
+        self._append(self.by_channel, (message.get("guild_id"), message["channel_id"]), message)
+        for token in tokens:
+            self._append(self.postings, token, message)
+
+        while len(self.messages) > self.max_messages:
+            self._evict_oldest()
+
+    def extend(self, messages: Iterable[Dict[str, Any]]) -> None:
+        for message in messages:
+            self.add(message)
+
+    def _evict_oldest(self) -> None:
+        message = self.messages.popleft()
+        self._pop_oldest(self.by_user, message["user_id"])
+        self._pop_oldest(self.by_channel, (message.get("guild_id"), message["channel_id"]))
+        for token in self._message_tokens.popleft():
+            self._pop_oldest(self.postings, token)
+
+    def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        return list(islice(reversed(self.by_user.get(user_id, ())), limit))
+
+    def get_recent_messages(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return list(islice(reversed(self.messages), limit))
+
+    def get_channel_messages(self, guild_id: int, channel_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        return list(islice(reversed(self.by_channel.get((guild_id, channel_id), ())), limit))
+
+    def search(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest messages containing every word of `keyword`, as a phrase."""
+        needle = keyword.lower()
+        tokens = tokenize(keyword)
+        if tokens:
+            buckets = [self.postings.get(token) for token in tokens]
+            if not all(buckets):
+                return []
+            # Walk the rarest word's postings and confirm the full phrase
+            candidates = min(buckets, key=len)
+        else:
+            candidates = self.messages
+
+        matches = (msg for msg in reversed(candidates) if needle in msg["content"].lower())
+        return list(islice(matches, limit))
+
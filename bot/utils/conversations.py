@@ -0,0 +1,152 @@
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) without an API round trip."""
+    return len(text) // 4 + 1
+
+
+class Conversation:
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Tuple[str, str]] = deque(maxlen=max_turns)
+        self.active = False
+        self.system_instruction: Optional[str] = None
+        self.last_active = time.monotonic()
+        self.size = 0
+
+    def add(self, role: str, text: str) -> int:
+        """Append a turn; returns the change in resident bytes."""
+        before = self.size
+        if len(self.turns) == self.turns.maxlen:
+            self.size -= len(self.turns[0][1].encode("utf-8"))
+        self.turns.append((role, text))
+        self.size += len(text.encode("utf-8"))
+        return self.size - before
+
+
+class ConversationStore:
+    """Per-user chat history with hard bounds on turns, prompt size and memory.
+
+    Each user keeps a ring buffer of their last `max_turns` turns, and
+    `context()` only returns as many recent turns as fit in
+    `max_context_tokens`. Sessions idle for `idle_ttl` seconds are dropped by
+    `sweep()`, and the least recently used sessions are evicted whenever
+    `max_sessions` or `max_bytes` would be exceeded.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 20,
+        max_context_tokens: int = 2000,
+        idle_ttl: float = 3600,
+        max_sessions: int = 1000,
+        max_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.max_turns = max_turns
+        self.max_context_tokens = max_context_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.sessions: "OrderedDict[Hashable, Conversation]" = OrderedDict()
+        self.resident_bytes = 0
+        self.evictions = 0
+        self.prompts = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def __contains__(self, user_id: Hashable) -> bool:
+        return user_id in self.sessions
+
+    def _touch(self, user_id: Hashable) -> Conversation:
+        conversation = self.sessions.get(user_id)
+        if conversation is None:
+            conversation = self.sessions[user_id] = Conversation(self.max_turns)
+        else:
+            self.sessions.move_to_end(user_id)
+        conversation.last_active = time.monotonic()
+        return conversation
+
+    def add(self, user_id: Hashable, text: str, is_user: bool = True) -> None:
+        conversation = self._touch(user_id)
+        self.resident_bytes += conversation.add("User" if is_user else "Assistant", text)
+        self._enforce_limits(keep=user_id)
+
+    def is_active(self, user_id: Hashable) -> bool:
+        conversation = self.sessions.get(user_id)
+        return conversation is not None and conversation.active
+
+    def start(self, user_id: Hashable, system_instruction: Optional[str] = None) -> None:
+        conversation = self._touch(user_id)
+        conversation.active = True
+        conversation.system_instruction = system_instruction
+
+    def system_instruction(self, user_id: Hashable) -> Optional[str]:
+        conversation = self.sessions.get(user_id)
+        return conversation.system_instruction if conversation is not None else None
+
+    def end(self, user_id: Hashable) -> None:
+        conversation = self.sessions.pop(user_id, None)
+        if conversation is not None:
+            self.resident_bytes -= conversation.size
+
+    def context(self, user_id: Hashable) -> List[Tuple[str, str]]:
+        """Most recent `(role, text)` turns that fit the token budget, oldest first."""
+        conversation = self.sessions.get(user_id)
+        if conversation is None:
+            return []
+
+        budget = self.max_context_tokens
+        selected: List[Tuple[str, str]] = []
+        for role, text in reversed(conversation.turns):
+            tokens = estimate_tokens(text)
+            if tokens > budget:
+                if not selected:
+                    # Keep the tail of an oversized latest turn rather than nothing
+                    selected.append((role, text[-budget * 4:]))
+                break
+            selected.append((role, text))
+            budget -= tokens
+        selected.reverse()
+        return selected
+
+    def record_prompt(self, tokens: int, cached_tokens: int = 0) -> None:
+        """Track prompt size per request; `cached_tokens` were served from a context cache."""
+        self.prompts += 1
+        self.prompt_tokens += tokens
+        self.cached_tokens += cached_tokens
+
+    def sweep(self) -> int:
+        """Drop sessions idle longer than `idle_ttl`; returns how many were removed."""
+        cutoff = time.monotonic() - self.idle_ttl
+        removed = 0
+        # OrderedDict is in LRU order, so stop at the first session still in use
+        while self.sessions:
+            user_id, conversation = next(iter(self.sessions.items()))
+            if conversation.last_active >= cutoff:
+                break
+            self.end(user_id)
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def _enforce_limits(self, keep: Optional[Hashable] = None) -> None:
+        while len(self.sessions) > self.max_sessions or self.resident_bytes > self.max_bytes:
+            user_id = next(iter(self.sessions))
+            if user_id == keep:
+                if len(self.sessions) == 1:
+                    break
+                self.sessions.move_to_end(user_id)
+                continue
+            self.end(user_id)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "sessions": len(self.sessions),
+            "resident_bytes": self.resident_bytes,
+            "evictions": self.evictions,
+            "avg_prompt_tokens": self.prompt_tokens / self.prompts if self.prompts else 0.0,
+            "cached_token_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
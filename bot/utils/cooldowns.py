@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from .persistence import atomic_write_json
+
+
+class CooldownService:
+    """Shared per-user cooldowns and rate limits, hung off the bot as `bot.cooldowns`.
+
+    Each bucket allows `rate` hits per `per` seconds for every key (a sliding
+    window; `rate=1` is a plain cooldown). A key only has an entry while one
+    of its hits is still inside the window, and `sweep()` drops the rest, so
+    memory tracks recently active users. With a `path`, state is loaded at
+    startup and saved by the background task, so limits survive restarts.
+    Timestamps are wall-clock for that reason.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        sweep_interval: float = 60.0,
+        runner: Optional[Callable[..., Awaitable[Any]]] = None,
+    ):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.runner = runner or asyncio.to_thread
+        self.limits: Dict[str, Tuple[int, float]] = {}
+        self.hits: Dict[str, Dict[str, Deque[float]]] = {}
+        self.dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self.hits.values())
+
+    def configure(self, bucket: str, rate: int, per: float) -> None:
+        """Define (or redefine) a bucket; state loaded from disk is kept."""
+        self.limits[bucket] = (rate, per)
+        keys = self.hits.setdefault(bucket, {})
+        for key, stamps in keys.items():
+            keys[key] = deque(stamps, maxlen=rate)
+
+    def retry_after(self, bucket: str, key: Hashable) -> float:
+        """Seconds until `key` may hit `bucket` again; 0 if it may now."""
+        rate, per = self.limits[bucket]
+        stamps = self.hits[bucket].get(str(key))
+        if not stamps or len(stamps) < rate:
+            return 0.0
+        return max(0.0, stamps[0] + per - time.time())
+
+    def hit(self, bucket: str, key: Hashable) -> float:
+        """Record a hit if allowed and return 0, else return the seconds to wait."""
+        wait = self.retry_after(bucket, key)
+        if wait:
+            return wait
+        rate, _ = self.limits[bucket]
+        keys = self.hits[bucket]
+        stamps = keys.get(str(key))
+        if stamps is None:
+            stamps = keys[str(key)] = deque(maxlen=rate)
+        stamps.append(time.time())
+        self.dirty = True
+        return 0.0
+
+    def reset(self, bucket: str, key: Hashable) -> None:
+        if self.hits.get(bucket, {}).pop(str(key), None) is not None:
+            self.dirty = True
+
+    def sweep(self) -> int:
+        """Drop keys whose newest hit has left the window; returns how many."""
+        now = time.time()
+        removed = 0
+        for bucket, keys in self.hits.items():
+            per = self.limits[bucket][1] if bucket in self.limits else 0.0
+            expired = [key for key, stamps in keys.items() if not stamps or stamps[-1] + per <= now]
+            for key in expired:
+                del keys[key]
+            removed += len(expired)
+        if removed:
+            self.dirty = True
+        return removed
+
+    def load(self) -> None:
+        """Restore saved state; call before the cogs configure their buckets."""
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved: Dict[str, Dict[str, List[float]]] = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error loading cooldowns from {self.path}: {e}")
+            return
+        for bucket, keys in saved.items():
+            self.hits[bucket] = {key: deque(stamps) for key, stamps in keys.items()}
+
+    async def save(self) -> None:
+        if not self.path or not self.dirty:
+            return
+        snapshot = {bucket: {key: list(stamps) for key, stamps in keys.items()} for bucket, keys in self.hits.items()}
+        self.dirty = False
+        try:
+            await self.runner(atomic_write_json, self.path, snapshot)
+        except Exception as e:
+            self.dirty = True
+            print(f"Error saving cooldowns to {self.path}: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="cooldown-sweeper")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.sweep()
+        await self.save()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+            await self.save()
@@ -0,0 +1,55 @@
+import random
+from typing import Generic, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, O(1) per weighted sample."""
+
+    def __init__(self, weights: Sequence[float], rng: Optional[random.Random] = None):
+        total = sum(weights)
+        if not weights or total <= 0 or any(w < 0 for w in weights):
+            raise ValueError("weights must be non-negative with a positive total")
+        self.rng = rng or random.Random()
+        n = len(weights)
+        self.prob = [w * n / total for w in weights]
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(self.prob) if p < 1.0]
+        large = [i for i, p in enumerate(self.prob) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.alias[s] = l
+            self.prob[l] += self.prob[s] - 1.0
+            (small if self.prob[l] < 1.0 else large).append(l)
+        # Whatever is left over is 1.0 up to float rounding
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self) -> int:
+        column = int(self.rng.random() * len(self.prob))
+        return column if self.rng.random() < self.prob[column] else self.alias[column]
+
+
+class DropEngine(Generic[T]):
+    """Weighted draws of distinct items, reproducible when given a `seed`."""
+
+    def __init__(self, items: Sequence[T], weights: Sequence[float], seed: Optional[int] = None):
+        if len(items) != len(weights):
+            raise ValueError("items and weights must be the same length")
+        self.items = list(items)
+        self.droppable = sum(1 for w in weights if w > 0)
+        self.table = AliasTable(weights, random.Random(seed))
+
+    def draw(self, count: int = 2) -> List[T]:
+        """`count` distinct items; each draw is weighted among those not yet drawn."""
+        if count > self.droppable:
+            raise ValueError(f"cannot draw {count} distinct items from {self.droppable}")
+        # Redrawing on a repeat gives exactly the without-replacement distribution
+        picked: List[int] = []
+        while len(picked) < count:
+            index = self.table.sample()
+            if index not in picked:
+                picked.append(index)
+        return [self.items[i] for i in picked]
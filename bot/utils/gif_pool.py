@@ -0,0 +1,107 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+# fetch(term) -> candidate URLs; may return duplicates of what the pool already holds
+Fetcher = Callable[[str], Awaitable[List[str]]]
+
+
+class GifPool:
+    """Per-search-term pools of GIF URLs, refilled in the background.
+
+    `pop()` never waits on the network: it hands out a pooled URL (or None when
+    the pool is empty) and schedules a refill once the pool falls below
+    `low_water`. At most one refill per term runs at a time, and refills of
+    a term are at least `min_refill_interval` seconds apart so a failing or
+    empty search doesn't cost a request per trigger. Entries expire
+    after `ttl` seconds, and URLs already pooled or recently handed out are
+    skipped so a refill doesn't serve the same GIF twice in a row.
+    """
+
+    def __init__(
+        self,
+        fetch: Fetcher,
+        low_water: int = 5,
+        ttl: float = 6 * 3600,
+        recent_size: int = 50,
+        min_refill_interval: float = 30,
+    ):
+        self.fetch = fetch
+        self.low_water = low_water
+        self.ttl = ttl
+        self.min_refill_interval = min_refill_interval
+        self.last_refill: Dict[str, float] = {}
+        self.pools: Dict[str, Deque[Tuple[float, str]]] = {}
+        self.recent: Dict[str, Deque[str]] = {}
+        self.recent_size = recent_size
+        self.refills: Dict[str, asyncio.Task] = {}
+        self.stats = {"served": 0, "empty": 0, "fetches": 0, "fetch_errors": 0, "duplicates": 0, "expired": 0}
+
+    def warm(self, terms: Iterable[str]) -> None:
+        for term in terms:
+            self.schedule_refill(term)
+
+    def size(self, term: str) -> int:
+        return len(self.pools.get(term, ()))
+
+    def pop(self, term: str) -> Optional[str]:
+        pool = self.pools.setdefault(term, deque())
+        now = time.monotonic()
+        # Refills push onto the left, so the oldest (first to expire) entries sit on the right
+        while pool and pool[-1][0] < now:
+            pool.pop()
+            self.stats["expired"] += 1
+
+        url = None
+        if pool:
+            # Oldest first, so little expires unused; each refill is shuffled so it's still random
+            url = pool.pop()[1]
+            self.recent.setdefault(term, deque(maxlen=self.recent_size)).append(url)
+            self.stats["served"] += 1
+        else:
+            self.stats["empty"] += 1
+
+        if len(pool) < self.low_water:
+            self.schedule_refill(term)
+        return url
+
+    def schedule_refill(self, term: str) -> None:
+        task = self.refills.get(term)
+        if task is not None and not task.done():
+            return
+        now = time.monotonic()
+        if now - self.last_refill.get(term, float("-inf")) < self.min_refill_interval:
+            return
+        self.last_refill[term] = now
+        self.refills[term] = asyncio.create_task(self.refill(term))
+
+    async def refill(self, term: str) -> None:
+        self.stats["fetches"] += 1
+        try:
+            urls = await self.fetch(term)
+        except Exception as e:
+            self.stats["fetch_errors"] += 1
+            print(f"Error refilling GIF pool for '{term}': {e}")
+            return
+
+        pool = self.pools.setdefault(term, deque())
+        seen: Set[str] = {url for _, url in pool}
+        seen.update(self.recent.get(term, ()))
+        fresh = []
+        for url in urls:
+            if url in seen:
+                self.stats["duplicates"] += 1
+                continue
+            seen.add(url)
+            fresh.append(url)
+        random.shuffle(fresh)
+        expires_at = time.monotonic() + self.ttl
+        pool.extendleft((expires_at, url) for url in fresh)
+
+    async def close(self) -> None:
+        for task in self.refills.values():
+            task.cancel()
+        await asyncio.gather(*self.refills.values(), return_exceptions=True)
+        self.refills.clear()
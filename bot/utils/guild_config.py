@@ -0,0 +1,126 @@
+import asyncio
+import copy
+from typing import Any, Callable, Dict, List, Optional
+
+WELCOME_MESSAGE = "welcome {mention}"
+
+# Called with (guild_id, config) after a guild's config is loaded or changed
+Listener = Callable[[int, Dict[str, Any]], None]
+
+
+def default_config(welcome_channel_id: Optional[int] = None) -> Dict[str, Any]:
+    """Settings for a guild that has never saved any; `triggers: None` means the built-in table."""
+    return {
+        "guild_id": None,
+        "version": 0,
+        "welcome_channel_id": welcome_channel_id,
+        "welcome_message": WELCOME_MESSAGE,
+        "triggers": None,
+    }
+
+
+class GuildConfigCache:
+    """Per-guild settings held in memory, hung off the bot as `bot.guild_configs`.
+
+    Only the keys a guild explicitly set are stored; `get()` lays them over
+    the defaults, so a guild keeps following the defaults for everything it
+    never changed. Every save bumps the guild's version in storage;
+    `refresh()` polls the versions and reloads only guilds whose version
+    moved, which also picks up edits made by another process. Listeners hear
+    about each guild that changed, so compiled state can be rebuilt for that
+    guild alone. With `owns`, only guilds it accepts are cached (e.g. those
+    on this process's shards).
+    """
+
+    def __init__(
+        self,
+        storage: Any,
+        defaults: Dict[str, Any],
+        poll_interval: float = 60.0,
+        owns: Optional[Callable[[int], bool]] = None,
+    ):
+        self.storage = storage
+        self.defaults = defaults
+        self.poll_interval = poll_interval
+        self.owns = owns or (lambda guild_id: True)
+        # guild_id -> the guild's own keys plus "guild_id" and "version"
+        self.overrides: Dict[int, Dict[str, Any]] = {}
+        self.listeners: List[Listener] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, guild_id: Optional[int]) -> Dict[str, Any]:
+        overrides = self.overrides.get(guild_id)
+        if overrides is None:
+            return self.defaults
+        return {**self.defaults, **overrides}
+
+    def subscribe(self, listener: Listener) -> None:
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _apply(self, overrides: Dict[str, Any]) -> None:
+        guild_id = overrides["guild_id"]
+        current = self.overrides.get(guild_id)
+        if current is not None and current["version"] >= overrides["version"]:
+            return
+        self.overrides[guild_id] = overrides
+        config = self.get(guild_id)
+        for listener in list(self.listeners):
+            try:
+                listener(guild_id, config)
+            except Exception as e:
+                print(f"Error applying config for guild {guild_id}: {e}")
+
+    async def load(self) -> None:
+        for overrides in await self.storage.get_guild_configs():
+            if self.owns(overrides["guild_id"]):
+                self._apply(overrides)
+
+    async def refresh(self) -> int:
+        """Reload guilds whose stored version is newer than ours; returns how many."""
+        versions = await self.storage.get_guild_config_versions()
+        stale = [
+            guild_id for guild_id, version in versions.items()
+            if self.owns(guild_id) and (guild_id not in self.overrides or self.overrides[guild_id]["version"] < version)
+        ]
+        if stale:
+            for overrides in await self.storage.get_guild_configs(stale):
+                self._apply(overrides)
+        return len(stale)
+
+    async def update(self, guild_id: int, mutate: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """Apply `mutate` to a copy of the guild's own keys, save them and return the resolved config.
+
+        `mutate` sees only what the guild set before; popping a key puts it back on the default.
+        """
+        if self._lock is None:
+            # Created on first use so it binds to the running loop, not the one at import time
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            current = self.overrides.get(guild_id, {})
+            saved = {key: copy.deepcopy(value) for key, value in current.items() if key not in ("guild_id", "version")}
+            mutate(saved)
+            version = await self.storage.save_guild_config(guild_id, saved)
+            self._apply({**saved, "guild_id": guild_id, "version": version})
+        return self.get(guild_id)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="guild-config-poller")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing guild configs: {e}")
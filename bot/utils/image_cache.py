@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import Executor
+from io import BytesIO
+from typing import Dict, Hashable, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+from PIL import Image, ImageOps
+
+from .persistence import atomic_write_bytes
+
+
+def decode_image(data: bytes, size: Optional[Tuple[int, int]] = None) -> Image.Image:
+    """Fully decode image bytes to RGB so later pastes never touch the source file.
+
+    With `size`, the image is scaled and center-cropped to exactly that size.
+    """
+    with Image.open(BytesIO(data)) as image:
+        image = image.convert("RGB")
+    if size is not None:
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    return image
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class CardImageCache:
+    """Decoded card art keyed by card id: in-memory LRU, then disk, then HTTP.
+
+    Concurrent requests for the same card share one load, and file I/O and
+    decoding run on `executor` so the event loop only waits on the network.
+    Originals are kept on disk; memory holds images scaled to `size`.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        cache_dir: str = "card_cache",
+        max_images: int = 32,
+        executor: Optional[Executor] = None,
+        size: Optional[Tuple[int, int]] = None,
+    ):
+        self.session = session
+        self.cache_dir = cache_dir
+        self.max_images = max_images
+        self.executor = executor
+        self.size = size
+        self.images: "OrderedDict[Hashable, Image.Image]" = OrderedDict()
+        self.pending: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "fetches": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, card_id: Hashable, url: str) -> str:
+        # The URL hash keeps a stale file from being served after the art changes
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+        extension = os.path.splitext(urlparse(url).path)[1] or ".img"
+        return os.path.join(self.cache_dir, f"{card_id}-{digest}{extension}")
+
+    async def get(self, card_id: Hashable, url: str) -> Image.Image:
+        image = self.images.get(card_id)
+        if image is not None:
+            self.images.move_to_end(card_id)
+            self.stats["memory_hits"] += 1
+            return image
+
+        task = self.pending.get(card_id)
+        if task is None:
+            task = self.pending[card_id] = asyncio.ensure_future(self._load(card_id, url))
+            task.add_done_callback(lambda _: self.pending.pop(card_id, None))
+        # Shielded so one cancelled caller does not cancel the load for everyone else
+        return await asyncio.shield(task)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _load(self, card_id: Hashable, url: str) -> Image.Image:
+        path = self.path_for(card_id, url)
+        image = None
+        if os.path.exists(path):
+            try:
+                image = await self._run(decode_image, await self._run(read_file, path), self.size)
+                self.stats["disk_hits"] += 1
+            except OSError as e:
+                print(f"Discarding unreadable cached card image {path}: {e}")
+
+        if image is None:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                data = await response.read()
+            self.stats["fetches"] += 1
+            image = await self._run(decode_image, data, self.size)
+            await self._run(atomic_write_bytes, path, data)
+
+        self.images[card_id] = image
+        while len(self.images) > self.max_images:
+            self.images.popitem(last=False)
+        return image
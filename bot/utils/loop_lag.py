@@ -0,0 +1,44 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LoopLagMonitor:
+    """Measures event-loop stalls by how late a periodic sleep wakes up."""
+
+    def __init__(self, interval: float = 0.05, samples: int = 2000):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=samples)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="loop-lag-monitor")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def percentile(self, pct: float) -> float:
+        """Lag in seconds at the given percentile of recent samples."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, float]:
+        """p50/p99/max lag in milliseconds."""
+        return {
+            "p50": self.percentile(50) * 1000,
+            "p99": self.percentile(99) * 1000,
+            "max": (max(self.samples) if self.samples else 0.0) * 1000,
+        }
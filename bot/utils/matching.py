@@ -0,0 +1,131 @@
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def is_word_char(char: str) -> bool:
+    """Mirror of the `\\w` class used by `re` for str patterns."""
+    return char.isalnum() or char == "_"
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds many keywords in a single pass.
+
+    Keywords added with `whole_word=True` only match where `\\bkeyword\\b`
+    would, so results line up with the per-keyword regexes this replaces.
+    Call `build()` after adding keywords; matching an unbuilt automaton
+    builds it on demand.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Any]] = (), whole_word: bool = True):
+        self.whole_word = whole_word
+        self.keywords: List[str] = []
+        self.values: List[Any] = []
+        self.word_bounded: List[bool] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Keywords ending at each state; `_output` adds those inherited along failure links
+        self._own: List[List[int]] = [[]]
+        self._output: List[List[int]] = [[]]
+        self._built = True
+
+        for keyword, value in keywords:
+            self.add(keyword, value)
+        self.build()
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def add(self, keyword: str, value: Any = None, whole_word: Optional[bool] = None) -> None:
+        if not keyword:
+            return
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+
+        self._own[state].append(len(self.keywords))
+        self.keywords.append(keyword)
+        self.values.append(value)
+        self.word_bounded.append(self.whole_word if whole_word is None else whole_word)
+        self._built = False
+
+    def build(self) -> None:
+        """Compute failure links and merge outputs along them; safe to call again after `add()`."""
+        self._output = [list(own) for own in self._own]
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                inherited = self._output[self._fail[next_state]]
+                if inherited:
+                    self._output[next_state] = self._output[next_state] + inherited
+
+        self._built = True
+
+    def _at_boundary(self, text: str, position: int) -> bool:
+        before = position > 0 and is_word_char(text[position - 1])
+        after = position < len(text) and is_word_char(text[position])
+        return before != after
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """Yield `(start, end, keyword_index)` for every match, ordered by end."""
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not output[state]:
+                continue
+
+            end = position + 1
+            for index in output[state]:
+                start = end - len(self.keywords[index])
+                if self.word_bounded[index] and not (
+                    self._at_boundary(text, start) and self._at_boundary(text, end)
+                ):
+                    continue
+                yield start, end, index
+
+    def count(self, text: str) -> int:
+        """Total matches, counting each keyword like `len(re.findall(...))` would."""
+        total = 0
+        last_end: Dict[int, int] = {}
+        for start, end, index in self.iter_matches(text):
+            if start < last_end.get(index, 0):
+                continue
+            last_end[index] = end
+            total += 1
+        return total
+
+    def first_value(self, text: str) -> Any:
+        """Value of the earliest-added keyword found in `text`, or None."""
+        best: Optional[int] = None
+        for _, _, index in self.iter_matches(text):
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return None if best is None else self.values[best]
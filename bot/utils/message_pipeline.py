@@ -0,0 +1,85 @@
+import time
+from functools import cached_property
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+from .chat_store import tokenize
+from .metrics import Histogram
+
+# Most stages are pure CPU and finish in microseconds; the tail covers ones that send messages
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class MessageContext:
+    """One incoming message, parsed once and shared by every stage."""
+
+    def __init__(self, message: Any):
+        self.message = message
+        self.content: str = message.content
+        self.lowered: str = self.content.lower()
+
+    @cached_property
+    def tokens(self) -> Set[str]:
+        return tokenize(self.lowered)
+
+    @cached_property
+    def mentions(self) -> FrozenSet[int]:
+        """IDs of the users mentioned, parsed from the raw content."""
+        return frozenset(self.message.raw_mentions)
+
+    @cached_property
+    def role_mentions(self) -> FrozenSet[int]:
+        return frozenset(self.message.raw_role_mentions)
+
+
+Stage = Callable[[MessageContext], Awaitable[Optional[bool]]]
+
+
+class MessagePipeline:
+    """Runs each non-bot message through registered stages, lowest order first.
+
+    A stage returns True to stop later stages seeing the message, e.g. once a
+    command has been invoked. A stage that raises is logged and skipped.
+    """
+
+    def __init__(self):
+        self.stages: Tuple[Tuple[int, str, Stage], ...] = ()
+        self.timings: Dict[str, Histogram] = {}
+        self.stops: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.messages = 0
+
+    def register(self, name: str, stage: Stage, order: int) -> None:
+        """Add a stage, replacing any stage with the same name (e.g. on cog reload)."""
+        others = [entry for entry in self.stages if entry[1] != name]
+        self.stages = tuple(sorted(others + [(order, name, stage)], key=lambda entry: entry[0]))
+        self.timings.setdefault(name, Histogram(STAGE_BUCKETS))
+        self.stops.setdefault(name, 0)
+        self.errors.setdefault(name, 0)
+
+    def unregister(self, name: str) -> None:
+        self.stages = tuple(entry for entry in self.stages if entry[1] != name)
+
+    async def dispatch(self, message: Any) -> None:
+        if message.author.bot:
+            return
+        self.messages += 1
+        ctx = MessageContext(message)
+        # Iterates a snapshot, so a cog (un)loading mid-message can't skip a stage
+        for _, name, stage in self.stages:
+            start = time.perf_counter()
+            try:
+                stop = await stage(ctx)
+            except Exception as e:
+                print(f"Message stage {name} failed: {e}")
+                self.errors[name] += 1
+                stop = False
+            self.timings[name].observe(time.perf_counter() - start)
+            if stop:
+                self.stops[name] += 1
+                return
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {**self.timings[name].summary(), "stops": self.stops[name], "errors": self.errors[name]}
+            for _, name, _ in self.stages
+        }
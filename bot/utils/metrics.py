@@ -0,0 +1,53 @@
+import bisect
+from typing import Dict, List, Sequence
+
+# Upper bounds in seconds; the last bucket catches everything slower
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cheap enough to record on every request."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the given percentile."""
+        if not self.count:
+            return 0.0
+        target = pct / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def format(self, unit: str = "s") -> str:
+        """One-line summary for embeds, in seconds or, with unit="ms", milliseconds."""
+        scale = 1000 if unit == "ms" else 1
+        s = {key: value * scale for key, value in self.summary().items() if key != "count"}
+        return (
+            f"n={self.count} mean={s['mean']:.2f}{unit} p50≤{s['p50']:g}{unit} "
+            f"p95≤{s['p95']:g}{unit} p99≤{s['p99']:g}{unit} max={s['max']:.2f}{unit}"
+        )
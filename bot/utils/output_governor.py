@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .scheduler import TokenBucket
+
+# Discord allows about 5 messages per 5 seconds in a channel
+CHANNEL_RATE = 1.0
+CHANNEL_BURST = 5
+# Channel tokens that ambient traffic can't touch, kept for command replies
+PRIORITY_RESERVE = 2
+# Ambient sends across all channels, well under Discord's 50/s global limit
+GLOBAL_RATE = 10.0
+GLOBAL_BURST = 20
+# Unconfigured groups: one send per this many seconds per channel
+DEFAULT_GROUP_PER = 5.0
+SWEEP_INTERVAL = 60.0
+
+
+class OutputGovernor:
+    """Rate limits the bot's unprompted ("ambient") messages, hung off the bot as `bot.output`.
+
+    Auto responses and swear-jar notices are ambient: they go out only while
+    their trigger group's bucket for the channel, the channel's bucket and a
+    global bucket all have a token, and otherwise are dropped rather than
+    queued. Command replies are the priority lane: `priority()` spends
+    channel tokens without ever being refused, and ambient sends must leave
+    `PRIORITY_RESERVE` tokens behind, so a trigger storm can't push a command
+    reply into Discord's rate limiter.
+
+    `notice()` coalesces per-user notices (e.g. swear counts) in a channel
+    into one message per `coalesce_window` seconds.
+    """
+
+    def __init__(self, coalesce_window: float = 5.0):
+        self.coalesce_window = coalesce_window
+        self.group_limits: Dict[str, Tuple[int, float]] = {}
+        self.channels: Dict[int, TokenBucket] = {}
+        self.groups: Dict[Tuple[int, str], TokenBucket] = {}
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        # (channel_id, group) -> (channel, {key: line}) waiting for the next flush
+        self.pending: Dict[Tuple[int, str], Tuple[Any, Dict[Hashable, str]]] = {}
+        self.flushes: Dict[Tuple[int, str], asyncio.Task] = {}
+        self.last_flush: Dict[Tuple[int, str], float] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.priority_sends = 0
+        self.last_sweep = time.monotonic()
+
+    def configure(self, group: str, rate: int, per: float) -> None:
+        """Allow `rate` ambient sends per `per` seconds per channel for `group`.
+
+        Re-configuring with the same limits is a no-op, so live buckets keep their state.
+        """
+        if self.group_limits.get(group) == (rate, per):
+            return
+        self.group_limits[group] = (rate, per)
+        self.groups = {key: bucket for key, bucket in self.groups.items() if key[1] != group}
+
+    def _stats(self, group: str) -> Dict[str, int]:
+        stats = self.stats.get(group)
+        if stats is None:
+            stats = self.stats[group] = {"sent": 0, "suppressed": 0, "coalesced": 0}
+        return stats
+
+    def _channel(self, channel_id: int) -> TokenBucket:
+        bucket = self.channels.get(channel_id)
+        if bucket is None:
+            bucket = self.channels[channel_id] = TokenBucket(CHANNEL_RATE, CHANNEL_BURST)
+        return bucket
+
+    def _group(self, channel_id: int, group: str) -> TokenBucket:
+        bucket = self.groups.get((channel_id, group))
+        if bucket is None:
+            rate, per = self.group_limits.get(group, (1, DEFAULT_GROUP_PER))
+            bucket = self.groups[(channel_id, group)] = TokenBucket(rate / per, rate)
+        return bucket
+
+    def _ambient_wait(self, channel_id: int) -> float:
+        return max(self._channel(channel_id).time_until(1 + PRIORITY_RESERVE), self.global_bucket.time_until())
+
+    def allow(self, channel_id: int, group: str) -> bool:
+        """Take an ambient send slot for `group` in the channel, or count it as suppressed."""
+        self.sweep()
+        group_bucket = self._group(channel_id, group)
+        if self._ambient_wait(channel_id) or group_bucket.time_until():
+            self._stats(group)["suppressed"] += 1
+            return False
+        group_bucket.spend()
+        self._channel(channel_id).spend()
+        self.global_bucket.spend()
+        self._stats(group)["sent"] += 1
+        return True
+
+    def priority(self, channel_id: Optional[int]) -> None:
+        """Record a command reply headed for the channel; never refused."""
+        self.priority_sends += 1
+        if channel_id is not None:
+            self._channel(channel_id).spend()
+
+    def notice(self, channel: Any, group: str, key: Hashable, line: str) -> None:
+        """Queue `line` for the channel's next `group` summary; a newer line from the same key replaces it."""
+        slot = (channel.id, group)
+        _, lines = self.pending.setdefault(slot, (channel, {}))
+        if key in lines:
+            self._stats(group)["coalesced"] += 1
+        lines[key] = line
+        if slot not in self.flushes:
+            # The first notice in a quiet channel goes out at once; later ones wait out the window
+            since = time.monotonic() - self.last_flush.get(slot, float("-inf"))
+            self._schedule_flush(slot, max(0.0, self.coalesce_window - since))
+
+    def _schedule_flush(self, slot: Tuple[int, str], delay: float) -> None:
+        self.flushes[slot] = asyncio.create_task(self.flush(slot, delay))
+
+    async def flush(self, slot: Tuple[int, str], delay: float = 0.0) -> None:
+        await asyncio.sleep(delay)
+        del self.flushes[slot]
+        if slot not in self.pending:
+            return
+        channel_id, group = slot
+        wait = self._ambient_wait(channel_id)
+        if wait:
+            # Keep collecting; the summary goes out once the channel has room
+            self._schedule_flush(slot, wait)
+            return
+
+        channel, lines = self.pending.pop(slot)
+        self._channel(channel_id).spend()
+        self.global_bucket.spend()
+        self.last_flush[slot] = time.monotonic()
+        stats = self._stats(group)
+        stats["sent"] += 1
+        stats["coalesced"] += len(lines) - 1
+        try:
+            await channel.send("\n".join(lines.values()))
+        except Exception as e:
+            print(f"Error sending {group} summary to channel {channel_id}: {e}")
+
+    def sweep(self) -> None:
+        """Every SWEEP_INTERVAL, drop buckets that have refilled, so memory tracks active channels."""
+        now = time.monotonic()
+        if now - self.last_sweep < SWEEP_INTERVAL:
+            return
+        self.last_sweep = now
+        self.channels = {k: b for k, b in self.channels.items() if b.time_until(b.capacity)}
+        self.groups = {k: b for k, b in self.groups.items() if b.time_until(b.capacity)}
+        self.last_flush = {k: t for k, t in self.last_flush.items() if now - t < self.coalesce_window}
+
+    def close(self) -> None:
+        for task in self.flushes.values():
+            task.cancel()
+        self.flushes.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "groups": {group: dict(stats) for group, stats in self.stats.items()},
+            "priority_sends": self.priority_sends,
+            "pending_notices": sum(len(lines) for _, lines in self.pending.values()),
+        }
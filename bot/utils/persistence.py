@@ -0,0 +1,34 @@
+import json
+import os
+import tempfile
+from typing import IO, Any, Callable
+
+
+def _atomic_replace(path: str, mode: str, write: Callable[[IO], None], **open_kwargs) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **open_kwargs) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs) -> None:
+    """Write JSON to a temp file beside `path`, fsync it, then rename over `path`.
+
+    Readers see either the old file or the new one, never a half-written file.
+    """
+    _atomic_replace(path, "w", lambda f: json.dump(data, f, **dump_kwargs), encoding="utf-8")
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Binary counterpart of `atomic_write_json`."""
+    _atomic_replace(path, "wb", lambda f: f.write(data))
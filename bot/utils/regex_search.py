@@ -0,0 +1,47 @@
+import asyncio
+import json
+import re
+import sys
+from itertools import islice
+from typing import List
+
+# Seconds a pattern may spend matching before its process is killed
+REGEX_TIMEOUT = 5.0
+
+
+async def search_texts(pattern: str, texts: List[str], limit: int = 10, timeout: float = REGEX_TIMEOUT) -> List[int]:
+    """Indices of the first `limit` texts matching the case-insensitive `pattern`.
+
+    CPython's `re` holds the GIL for a whole match, so a backtracking-heavy
+    pattern stalls the event loop even from a worker thread. The match runs
+    in a child process instead, which is killed after `timeout` seconds.
+    Raises `re.error` for an invalid pattern and `asyncio.TimeoutError`
+    when the match takes too long.
+    """
+    re.compile(pattern)  # raise re.error here rather than in the child
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-I", __file__,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    request = json.dumps({"pattern": pattern, "texts": texts, "limit": limit}).encode()
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(request), timeout)
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode:
+        raise RuntimeError(f"Regex search process exited with {proc.returncode}")
+    return json.loads(stdout)
+
+
+def main() -> None:
+    request = json.load(sys.stdin)
+    compiled = re.compile(request["pattern"], re.IGNORECASE)
+    matches = (i for i, text in enumerate(request["texts"]) if compiled.search(text))
+    json.dump(list(islice(matches, request["limit"])), sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, width and whitespace so trivially different phrasings share a key."""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+
+class ResponseCache:
+    """TTL + LRU cache that also collapses concurrent identical requests.
+
+    `lookup()` returns `(HIT, value)`, `(COALESCED, future)` when the same key
+    is already being computed, or `(MISS, None)` after registering the caller
+    as the one computing it. That caller must then call `resolve()` or
+    `abandon()` so waiters are released.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(question: str, style_prompt: str) -> Tuple[str, str]:
+        return normalize_question(question), style_prompt
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def lookup(self, key: Hashable) -> Tuple[str, Any]:
+        value = self.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return HIT, value
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return COALESCED, future
+
+        self.stats["misses"] += 1
+        self.in_flight[key] = asyncio.get_running_loop().create_future()
+        return MISS, None
+
+    def resolve(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+        future = self.in_flight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def abandon(self, key: Hashable, error: BaseException) -> None:
+        future = self.in_flight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+            # Mark retrieved so an error nobody waited on is not logged
+            future.exception()
@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+
+from .metrics import Histogram
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, amount: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def spend(self, amount: float = 1.0) -> None:
+        """Take tokens unconditionally; the bucket may go into debt down to -capacity."""
+        self._refill()
+        self.tokens = max(-self.capacity, self.tokens - amount)
+
+    def time_until(self, amount: float = 1.0) -> float:
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+
+class Ticket:
+    """A caller's place in the scheduler; granted once its future resolves."""
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.released = False
+
+    @property
+    def granted(self) -> bool:
+        return self.future.done()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """True once granted; False if `timeout` passes first."""
+        try:
+            await asyncio.wait_for(asyncio.shield(self.future), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class FairScheduler:
+    """Admits work under a global concurrency cap, a per-key in-flight limit
+    and a token-bucket rate limit, serving waiting keys round-robin so one
+    busy user cannot starve the rest.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        per_key_limit: int = 1,
+        rate_per_minute: float = 10,
+        burst: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_key_limit = per_key_limit
+        self.bucket = TokenBucket(rate_per_minute / 60, burst or max(1.0, rate_per_minute / 6))
+        self.queues: Dict[Hashable, Deque[Ticket]] = {}
+        self.ring: Deque[Hashable] = deque()
+        self.in_flight: Dict[Hashable, int] = {}
+        self.running = 0
+        self.queue_wait = Histogram()
+        self.service_time = Histogram()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def submit(self, key: Hashable) -> Ticket:
+        ticket = Ticket(key)
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            self.ring.append(key)
+        queue.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """Estimated number of requests served before this one (0 once granted)."""
+        if ticket.granted:
+            return 0
+        queue = self.queues.get(ticket.key)
+        if not queue or ticket not in queue:
+            return 0
+        index = queue.index(ticket)
+        ahead = index
+        passed_own_key = False
+        for key in self.ring:
+            if key == ticket.key:
+                passed_own_key = True
+                continue
+            # Keys earlier in the ring get one extra turn before ours comes round
+            ahead += min(len(self.queues[key]), index + (0 if passed_own_key else 1))
+        return ahead + 1
+
+    def release(self, ticket: Ticket) -> None:
+        """Finish a granted ticket, or withdraw one that is still waiting."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted:
+            self.running -= 1
+            self.in_flight[ticket.key] -= 1
+            if not self.in_flight[ticket.key]:
+                del self.in_flight[ticket.key]
+            self.service_time.observe(time.monotonic() - ticket.started_at)
+        else:
+            queue = self.queues.get(ticket.key)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self.queues[ticket.key]
+                    self.ring.remove(ticket.key)
+            ticket.future.cancel()
+        self._dispatch()
+
+    def _next_key(self) -> Optional[Hashable]:
+        for _ in range(len(self.ring)):
+            key = self.ring[0]
+            self.ring.rotate(-1)
+            if self.in_flight.get(key, 0) < self.per_key_limit:
+                return key
+        return None
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_concurrency and self.ring:
+            key = self._next_key()
+            if key is None:
+                return
+            if not self.bucket.try_take():
+                # Undo the rotation so this key keeps its turn, then retry when a token is due
+                self.ring.rotate(1)
+                self._schedule_retry(self.bucket.time_until())
+                return
+
+            queue = self.queues[key]
+            ticket = queue.popleft()
+            if not queue:
+                del self.queues[key]
+                self.ring.remove(key)
+
+            ticket.started_at = time.monotonic()
+            self.queue_wait.observe(ticket.started_at - ticket.enqueued_at)
+            self.running += 1
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+            ticket.future.set_result(True)
+
+    def _schedule_retry(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            return
+
+        def retry():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(delay, retry)
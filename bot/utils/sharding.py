@@ -0,0 +1,70 @@
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """The shard Discord routes a guild's events to."""
+    return (guild_id >> 22) % shard_count
+
+
+def parse_shard_ids(value: Optional[str]) -> Optional[List[int]]:
+    """"0,1,4-7" -> [0, 1, 4, 5, 6, 7]; empty means every shard."""
+    if not value:
+        return None
+    shard_ids = []
+    for part in value.split(","):
+        start, _, end = part.strip().partition("-")
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(shard_ids))
+
+
+class ShardMetrics:
+    """Per-shard event rate and gateway connection counters.
+
+    Events are counted in one-second slots over the last `window` seconds,
+    so the rate costs O(1) per event and memory stays bounded.
+    """
+
+    COUNTERS = ("connects", "disconnects", "resumes")
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self.counters: Dict[int, Dict[str, int]] = {}
+        self.slots: Dict[int, Deque[List[int]]] = {}
+        self.events: Dict[int, int] = {}
+
+    def _counters(self, shard_id: int) -> Dict[str, int]:
+        counters = self.counters.get(shard_id)
+        if counters is None:
+            counters = self.counters[shard_id] = dict.fromkeys(self.COUNTERS, 0)
+        return counters
+
+    def record(self, shard_id: int, counter: str) -> None:
+        self._counters(shard_id)[counter] += 1
+
+    def record_event(self, shard_id: Optional[int]) -> None:
+        shard_id = shard_id or 0
+        now = int(time.monotonic())
+        slots = self.slots.get(shard_id)
+        if slots is None:
+            slots = self.slots[shard_id] = deque()
+        if slots and slots[-1][0] == now:
+            slots[-1][1] += 1
+        else:
+            slots.append([now, 1])
+            while slots[0][0] <= now - self.window:
+                slots.popleft()
+        self.events[shard_id] = self.events.get(shard_id, 0) + 1
+
+    def event_rate(self, shard_id: int) -> float:
+        """Events per second over the last `window` seconds."""
+        cutoff = int(time.monotonic()) - self.window
+        return sum(count for second, count in self.slots.get(shard_id, ()) if second > cutoff) / self.window
+
+    def summary(self, shard_id: int) -> Dict[str, float]:
+        return {
+            **self._counters(shard_id),
+            "events": self.events.get(shard_id, 0),
+            "events_per_second": self.event_rate(shard_id),
+        }
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+# Days of per-day focus minutes kept in a rollup; enough for weekly totals
+ROLLUP_DAYS = 28
+
+
+def empty_stats() -> Dict[str, Any]:
+    return {
+        "total_minutes": 0,
+        "sessions": 0,
+        "daily": {},
+        "current_streak": 0,
+        "longest_streak": 0,
+        "last_day": None,
+    }
+
+
+def apply_session(stats: Optional[Dict[str, Any]], day: date, minutes: int) -> Dict[str, Any]:
+    """Fold one finished session into a user's rollup, in O(ROLLUP_DAYS).
+
+    Days are ISO strings so the rollup stores as-is in JSON and MongoDB.
+    A streak counts consecutive days with at least one focused minute.
+    """
+    stats = dict(stats) if stats else empty_stats()
+    stats["sessions"] += 1
+    if minutes <= 0:
+        return stats
+
+    key = day.isoformat()
+    daily = dict(stats["daily"])
+    daily[key] = daily.get(key, 0) + minutes
+    cutoff = (day - timedelta(days=ROLLUP_DAYS - 1)).isoformat()
+    stats["daily"] = {d: m for d, m in daily.items() if d >= cutoff}
+    stats["total_minutes"] += minutes
+
+    last_day = date.fromisoformat(stats["last_day"]) if stats["last_day"] else None
+    if last_day is None or day > last_day:
+        stats["current_streak"] = stats["current_streak"] + 1 if last_day == day - timedelta(days=1) else 1
+        stats["last_day"] = key
+        stats["longest_streak"] = max(stats["longest_streak"], stats["current_streak"])
+    return stats
+
+
+def summarize(stats: Optional[Dict[str, Any]], today: date) -> Dict[str, int]:
+    """Figures for display as of `today`; a streak lapses after a day with no focus."""
+    stats = stats or empty_stats()
+    daily = stats["daily"]
+    week_start = (today - timedelta(days=6)).isoformat()
+    last_day = date.fromisoformat(stats["last_day"]) if stats["last_day"] else None
+    streak_alive = last_day is not None and last_day >= today - timedelta(days=1)
+    return {
+        "today_minutes": daily.get(today.isoformat(), 0),
+        "week_minutes": sum(m for d, m in daily.items() if d >= week_start),
+        "total_minutes": stats["total_minutes"],
+        "sessions": stats["sessions"],
+        "current_streak": stats["current_streak"] if streak_alive else 0,
+        "longest_streak": stats["longest_streak"],
+    }
@@ -0,0 +1,104 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from .metrics import Histogram
+
+# Upper bounds in seconds for how late a timer fires
+JITTER_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+class DeadlineScheduler:
+    """Many keyed timers driven by one task sleeping until the earliest deadline.
+
+    Deadlines are wall-clock (`time.time()`) so they can be persisted and
+    rescheduled after a restart. Rescheduling or cancelling a key leaves its
+    old heap entry behind to be skipped when popped, and the heap is rebuilt
+    if those stale entries pile up. `callback(key)` runs in its own task.
+    """
+
+    def __init__(self, callback: Callable[[Hashable], Awaitable[None]]):
+        self.callback = callback
+        self.heap: List[Tuple[float, int, Hashable]] = []
+        self.deadlines: Dict[Hashable, Tuple[float, int]] = {}
+        self.lateness = Histogram(JITTER_BUCKETS)
+        self._counter = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.deadlines
+
+    def schedule(self, key: Hashable, when: float) -> None:
+        """Fire `callback(key)` at `when`, replacing any timer `key` already has."""
+        entry = (when, next(self._counter))
+        self.deadlines[key] = entry
+        heapq.heappush(self.heap, (entry[0], entry[1], key))
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.heap = [(w, seq, k) for k, (w, seq) in self.deadlines.items()]
+            heapq.heapify(self.heap)
+        if self.heap[0][1] == entry[1] and self._wake is not None:
+            self._wake.set()
+
+    def cancel(self, key: Hashable) -> None:
+        self.deadlines.pop(key, None)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="deadline-scheduler")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _pop_due(self, now: float) -> List[Tuple[float, Hashable]]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, seq, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) == (when, seq):
+                del self.deadlines[key]
+                due.append((when, key))
+        return due
+
+    def _next_delay(self) -> Optional[float]:
+        # Drop cancelled entries at the head so they don't cause spurious wakeups
+        while self.heap and self.deadlines.get(self.heap[0][2]) != self.heap[0][:2]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return self.heap[0][0] - time.time()
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            delay = self._next_delay()
+            if delay is None:
+                await self._wake.wait()
+                continue
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            for when, key in self._pop_due(now):
+                self.lateness.observe(now - when)
+                task = asyncio.get_running_loop().create_task(self._fire(key))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key: Hashable) -> None:
+        try:
+            await self.callback(key)
+        except Exception as e:
+            print(f"Error in timer callback for {key}: {e}")